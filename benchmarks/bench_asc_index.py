@@ -0,0 +1,63 @@
+##############################################################################################
+######## Benchmark for scoring questions by reading ASCs vs. from their trial indexes ########
+##############################################################################################
+
+# Writes a synthetic ASC, then times scoring its questions by reading it through as text, building its trial index,
+# and scoring it again from the saved index (what later runs do), checking that all of them give the same scores
+
+import os, sys, json, time, argparse, tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from synthetic import write_asc
+from prasc_lib.questions import score_questions, score_questions_indexed
+from prasc_lib.asc_index import build_index, index_loc
+
+def timed(func, *args):
+	start = time.perf_counter()
+	result = func(*args)
+	return result, time.perf_counter() - start
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser()
+	parser.add_argument('-i', '--items', type = int, default = 200, help = "Number of trials in the ASC.")
+	parser.add_argument('-f', '--fixations', type = int, default = 200, help = "Number of fixations per trial.")
+	parser.add_argument('-o', '--output', help = "JSON lines file to append the results to.")
+	args = parser.parse_args()
+
+	with tempfile.TemporaryDirectory(prefix = 'prASC_bench_') as temp_dir:
+		asc_loc = Path(temp_dir) / 'subj000.asc'
+		write_asc(asc_loc, 0, args.items, 4, args.fixations, questions = 0.5)
+		size_mb = os.path.getsize(asc_loc) / (1024 * 1024)
+
+		text_scores, text_seconds = timed(score_questions, str(asc_loc))
+		entries, build_seconds = timed(build_index, str(asc_loc))
+		first_scores, first_seconds = timed(score_questions_indexed, str(asc_loc))
+		indexed_scores, indexed_seconds = timed(score_questions_indexed, str(asc_loc))
+
+		if not text_scores == first_scores == indexed_scores:
+			print("Error: scores from the trial index don't match scores from reading the ASC. Exiting...")
+			sys.exit(1)
+
+		record = {
+			'benchmark': 'asc_index',
+			'asc_mb': round(size_mb, 2),
+			'markers': len(entries),
+			'index_kb': round(os.path.getsize(index_loc(asc_loc)) / 1024, 1),
+			'read_text_seconds': round(text_seconds, 4),
+			'build_index_seconds': round(build_seconds, 4),
+			'first_indexed_seconds': round(first_seconds, 4),
+			'indexed_seconds': round(indexed_seconds, 4),
+		}
+
+	print("%.1f MB ASC with %d marker lines (index %.1f KB)" % (record['asc_mb'], record['markers'], record['index_kb']))
+	print("  reading the ASC as text:     %8.4fs" % record['read_text_seconds'])
+	print("  building the index:          %8.4fs" % record['build_index_seconds'])
+	print("  first run (build and save):  %8.4fs" % record['first_indexed_seconds'])
+	print("  later runs (saved index):    %8.4fs" % record['indexed_seconds'])
+
+	if args.output:
+		with open(args.output, 'a') as file:
+			file.write(json.dumps(record) + '\n')
+		print("Results appended to " + args.output + ".")
@@ -0,0 +1,67 @@
+##############################################################################################
+########### Benchmark for reading ASCs compressed with gzip and xz vs. uncompressed ##########
+##############################################################################################
+
+# Writes a synthetic ASC and compressed copies of it, then times scoring its questions by reading each one through,
+# checking that they all give the same scores. Also shows how much smaller each compressed copy is
+
+import os, sys, json, time, argparse, tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from synthetic import write_asc
+from prasc_lib.questions import score_questions
+from prasc_lib.compressed import has_compression, compress_file
+
+def timed(func, *args):
+	start = time.perf_counter()
+	result = func(*args)
+	return result, time.perf_counter() - start
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser()
+	parser.add_argument('-i', '--items', type = int, default = 200, help = "Number of trials in the ASC.")
+	parser.add_argument('-f', '--fixations', type = int, default = 200, help = "Number of fixations per trial.")
+	parser.add_argument('-o', '--output', help = "JSON lines file to append the results to.")
+	args = parser.parse_args()
+
+	records = []
+	with tempfile.TemporaryDirectory(prefix = 'prASC_bench_') as temp_dir:
+		asc_loc = Path(temp_dir) / 'subj000.asc'
+		write_asc(asc_loc, 0, args.items, 4, args.fixations, questions = 0.5)
+		plain_scores, _ = timed(score_questions, str(asc_loc))
+
+		for kind in [None, 'gz', 'zst', 'xz']:
+			if not has_compression(kind):
+				print("%-6s skipped (zstandard not installed)" % kind)
+				continue
+
+			loc = asc_loc
+			compress_seconds = 0
+			if kind is not None:
+				loc = Path(str(asc_loc) + '.' + kind)
+				_, compress_seconds = timed(compress_file, asc_loc, loc, kind)
+
+			scores, seconds = timed(score_questions, str(loc))
+			if [row[1:] for row in scores[0]] != [row[1:] for row in plain_scores[0]] or scores[1:] != plain_scores[1:]:
+				print("Error: scores from the " + str(kind) + " ASC don't match scores from the uncompressed ASC. Exiting...")
+				sys.exit(1)
+
+			records.append({
+				'benchmark': 'compressed',
+				'compression': kind or 'none',
+				'asc_mb': round(os.path.getsize(loc) / (1024 * 1024), 2),
+				'compress_seconds': round(compress_seconds, 4),
+				'read_seconds': round(seconds, 4),
+			})
+
+	plain_mb = records[0]['asc_mb']
+	for record in records:
+		print("%-6s %8.2f MB (%4.1fx smaller)  read and scored in %8.4fs" % (record['compression'], record['asc_mb'], plain_mb / record['asc_mb'], record['read_seconds']))
+
+	if args.output:
+		with open(args.output, 'a') as file:
+			for record in records:
+				file.write(json.dumps(record) + '\n')
+		print("Results appended to " + args.output + ".")
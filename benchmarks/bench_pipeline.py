@@ -0,0 +1,97 @@
+##############################################################################################
+######## Benchmark for the whole of prASC.py on synthetic experiments of several sizes #######
+##############################################################################################
+
+# For each scale, writes a synthetic experiment, runs prASC.py on it with fix_align mocked by the stand-in Rscript,
+# and reads the time, CPU time, and memory use of each stage from the run report prASC.py writes
+# Results can be appended to a JSON lines file with '--output', with the git commit they were run on, to compare across versions
+
+import os, sys, json, argparse, platform, subprocess, tempfile
+from datetime import datetime
+from pathlib import Path
+
+from synthetic import make_experiment, write_parameters, install_fake_rscript
+
+repo_dir = Path(__file__).resolve().parents[1]
+
+def git_version():
+	try:
+		return subprocess.run(['git', 'describe', '--always', '--dirty'], cwd = repo_dir, stdout = subprocess.PIPE, stderr = subprocess.DEVNULL, universal_newlines = True).stdout.strip() or None
+	except OSError:
+		return None
+
+# Parse a scale like 8x32 into (participants, items)
+def parse_scale(scale):
+	participants, items = scale.lower().split('x')
+	return int(participants), int(items)
+
+# Run prASC.py on the parameters file, and return its run report
+def run_prasc(parameters_loc, output_dir, extra_args, env):
+	result = subprocess.run([sys.executable, str(repo_dir / 'prASC.py'), str(parameters_loc), '-o', '-k'] + extra_args, env = env, stdin = subprocess.DEVNULL, stdout = subprocess.PIPE, stderr = subprocess.STDOUT, universal_newlines = True)
+	if result.returncode != 0:
+		print(result.stdout)
+		print("Error: prASC.py exited with status " + str(result.returncode) + ". Exiting...")
+		sys.exit(1)
+
+	with open(Path(output_dir) / 'prASC_run_report.json', 'r') as file:
+		return json.load(file)
+
+# Keep the totals for each stage, without the measurements for each file
+def stage_summary(report):
+	return {stage['name']: {key: stage.get(key) for key in ['wall_seconds', 'cpu_seconds', 'peak_rss_mb', 'files', 'input_bytes']} for stage in report['stages']}
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser()
+	parser.add_argument('-s', '--scales', default = '2x16,8x32,32x64', help = "Comma separated sizes to run, as participants x items. Default is 2x16,8x32,32x64.")
+	parser.add_argument('-c', '--conditions', type = int, default = 4, help = "Number of conditions per item.")
+	parser.add_argument('-f', '--fixations', type = int, default = 20, help = "Number of fixations per trial.")
+	parser.add_argument('-q', '--questions', type = float, default = 0.5, help = "Proportion of trials with a comprehension question (0 for none).")
+	parser.add_argument('-j', '--jobs', type = int, default = 1, help = "Number of jobs to run prASC.py with.")
+	parser.add_argument('--nofix', default = False, action = 'store_true', help = "Skip the fix_align stage instead of running it with the stand-in Rscript.")
+	parser.add_argument('--warm', default = False, action = 'store_true', help = "Also time a second run of each scale, with the SideEye cache from the first run.")
+	parser.add_argument('--prasc-args', default = '', help = "Other arguments to pass to prASC.py (e.g. '--output-format parquet').")
+	parser.add_argument('-o', '--output', help = "JSON lines file to append the results to.")
+	args = parser.parse_args()
+
+	records = []
+	with tempfile.TemporaryDirectory(prefix = 'prASC_bench_') as temp_dir:
+		env = dict(os.environ)
+		fix_align_loc = None
+		if not args.nofix:
+			fix_align_loc = install_fake_rscript(Path(temp_dir) / 'bin')
+			env['PATH'] = str(Path(temp_dir) / 'bin') + os.pathsep + env.get('PATH', '')
+
+		extra_args = ['-j', str(args.jobs)] + (['-nf'] if args.nofix else []) + args.prasc_args.split()
+
+		for scale in args.scales.split(','):
+			participants, items = parse_scale(scale)
+			exp_dir = Path(temp_dir) / scale
+			locations = make_experiment(exp_dir, participants, items, args.conditions, args.fixations, args.questions)
+			write_parameters(exp_dir / 'parameters.py', locations, fix_align_loc)
+
+			runs = ['cold', 'warm'] if args.warm else ['cold']
+			for run in runs:
+				report = run_prasc(exp_dir / 'parameters.py', locations['output_dir'], extra_args, env)
+				record = {
+					'benchmark': 'pipeline',
+					'version': git_version(),
+					'date': datetime.now().isoformat(timespec = 'seconds'),
+					'python': platform.python_version(),
+					'scale': {'participants': participants, 'items': items, 'conditions': args.conditions, 'fixations': args.fixations, 'questions': args.questions},
+					'run': run,
+					'arguments': extra_args,
+					'wall_seconds': report['wall_seconds'],
+					'peak_rss_mb': report['peak_rss_mb'],
+					'stages': stage_summary(report),
+				}
+				records.append(record)
+
+				print("%s (%s): %.2fs total" % (scale, run, report['wall_seconds']))
+				for name, stage in record['stages'].items():
+					print("  %-18s %8.3fs wall %8.3fs cpu %8.1f MB peak" % (name, stage['wall_seconds'], stage['cpu_seconds'], stage['peak_rss_mb'] or 0))
+
+	if args.output:
+		with open(args.output, 'a') as file:
+			for record in records:
+				file.write(json.dumps(record) + '\n')
+		print("Results appended to " + args.output + ".")
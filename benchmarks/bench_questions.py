@@ -0,0 +1,101 @@
+##############################################################################################
+############ Benchmark for question scoring: the temp file loop vs. score_questions ###########
+##############################################################################################
+
+import os, sys, time, random, argparse, tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from prasc_lib.questions import score_questions
+
+# Write out a fake ASC file with roughly the shape of an EyeLink recording
+def make_asc(path, trials = 120, samples_per_trial = 2000, seed = 0):
+	rng = random.Random(seed)
+	t = 1000
+	with open(path, 'w') as asc:
+		for trial in range(1, trials + 1):
+			asc.write('MSG\t%d TRIALID E%dI%dD0\n' % (t, rng.randint(1, 4), trial))
+			asc.write('MSG\t%d SYNCTIME\n' % (t + 1))
+			for _ in range(samples_per_trial):
+				t = t + 1
+				asc.write('%d\t %.1f\t %.1f\t %.1f\t...\n' % (t, rng.uniform(0, 1024), rng.uniform(0, 768), 1000.0))
+			if rng.random() < 0.5:
+				asc.write('MSG\t%d QUESTION_ANSWER %d\n' % (t, rng.randint(1, 2)))
+			asc.write('MSG\t%d TRIAL_RESULT %d\n' % (t + 1, rng.randint(1, 2)))
+			t = t + 100
+
+# The question loop as it was in prASC.py, which writes matching lines to a temp file and reads them back
+def legacy_score_questions(file, temp_dir, start_flag = 'TRIALID'):
+	rows = []
+	search_strings = [start_flag, 'QUESTION_ANSWER', 'TRIAL_RESULT']
+	filename = open(file, 'r')
+	temp_quest_file = open(Path(temp_dir) / 'temp_quest_file','w+')
+	for line in filename:
+		for entry in search_strings:
+			if entry in line:
+				temp_quest_file.write(line)
+
+	temp_quest_file.seek(0,0)
+	qcount = 0
+	acount = 0
+	for line in temp_quest_file:
+		if search_strings[0] in line:
+			correct = 'none'
+			fields = line.split()
+			start_time = int(fields[1])
+			first_split = fields[3].split('I')
+			cond_num = first_split[0][1:]
+			item_num = first_split[1].split('D')[0]
+		elif search_strings[1] in line:
+			correct = line.split()[3]
+		else:
+			fields = line.split()
+			end_time = int(fields[1])
+			answer = fields[3]
+			if correct != 'none':
+				qcount = qcount + 1
+				was_response_correct = "FALSE"
+				if correct == answer:
+					was_response_correct = "TRUE"
+					acount = acount + 1
+				rows.append(['"' + str(file) + '"', cond_num, item_num, correct, answer, was_response_correct, str(end_time - start_time)])
+
+	temp_quest_file.close()
+	filename.close()
+	os.remove(Path(temp_dir) / 'temp_quest_file')
+	return rows, qcount, acount
+
+def best_of(repeats, func, *args):
+	times = []
+	for _ in range(repeats):
+		start = time.perf_counter()
+		result = func(*args)
+		times.append(time.perf_counter() - start)
+	return min(times), result
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser()
+	parser.add_argument('-f', '--files', type = int, default = 5, help = "Number of synthetic ASC files to score.")
+	parser.add_argument('-t', '--trials', type = int, default = 120, help = "Number of trials per file.")
+	parser.add_argument('-s', '--samples', type = int, default = 2000, help = "Number of sample lines per trial.")
+	parser.add_argument('-n', '--repeats', type = int, default = 3, help = "Number of repeats (the best time is reported).")
+	args = parser.parse_args()
+
+	with tempfile.TemporaryDirectory() as temp_dir:
+		files = []
+		for i in range(args.files):
+			files.append(str(Path(temp_dir) / ('subj%d.asc' % i)))
+			make_asc(files[-1], args.trials, args.samples, seed = i)
+
+		size = sum(os.path.getsize(f) for f in files)
+		legacy_time, legacy = best_of(args.repeats, lambda: [legacy_score_questions(f, temp_dir) for f in files])
+		new_time, new = best_of(args.repeats, lambda: [score_questions(f) for f in files])
+
+		if legacy != new:
+			print("Error: score_questions output differs from the legacy loop.")
+			sys.exit(1)
+
+		print("Scored %d files (%.1f MB)" % (len(files), size / 1e6))
+		print("legacy loop:     %.3fs" % legacy_time)
+		print("score_questions: %.3fs (%.2fx)" % (new_time, legacy_time / new_time))
@@ -0,0 +1,79 @@
+##############################################################################################
+######### Benchmark for how long prASC.py takes to start, and what it imports to do it #######
+##############################################################################################
+
+# Times prASC.py with --help, with --dry-run, and scoring questions only on a small synthetic experiment, and reads
+# Python's -X importtime output to show the modules that took longest to import, and whether pandas and SideEye were imported at all
+# Runs that don't combine results or use SideEye shouldn't import either
+
+import os, sys, json, time, argparse, statistics, subprocess, tempfile
+from pathlib import Path
+
+from synthetic import make_experiment, write_parameters
+
+repo_dir = Path(__file__).resolve().parents[1]
+
+# Modules that should only be imported by the stages that need them
+heavy_modules = ['pandas', 'numpy', 'sideeye', 'pyarrow']
+
+# Run prASC.py with -X importtime, and return the cumulative import time of each top level module in seconds
+def run_prasc(args):
+	command = [sys.executable, '-X', 'importtime', str(repo_dir / 'prASC.py')] + args
+	result = subprocess.run(command, stdin = subprocess.DEVNULL, stdout = subprocess.PIPE, stderr = subprocess.PIPE, universal_newlines = True)
+	if result.returncode != 0:
+		print(result.stdout)
+		print("Error: prASC.py exited with status " + str(result.returncode) + ". Exiting...")
+		sys.exit(1)
+
+	imports = {}
+	for line in result.stderr.splitlines():
+		if not line.startswith('import time:') or 'cumulative' in line:
+			continue
+		_, cumulative, name = line.split('|')
+		# Only keep top level modules, since their times include the modules they import
+		if not name.startswith('  '):
+			imports[name.strip()] = int(cumulative) / 1e6
+	return imports
+
+def timed_runs(args, repeat):
+	times = []
+	imports = None
+	for _ in range(repeat):
+		start = time.perf_counter()
+		imports = run_prasc(args)
+		times.append(time.perf_counter() - start)
+	return statistics.median(times), imports
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser()
+	parser.add_argument('-r', '--repeat', type = int, default = 5, help = "Number of times to run each case. The median time is reported.")
+	parser.add_argument('-t', '--top', type = int, default = 5, help = "Number of slowest imports to show for each case.")
+	parser.add_argument('-o', '--output', help = "JSON lines file to append the results to.")
+	args = parser.parse_args()
+
+	records = []
+	with tempfile.TemporaryDirectory(prefix = 'prASC_bench_') as temp_dir:
+		locations = make_experiment(temp_dir, participants = 2, items = 8)
+		write_parameters(Path(temp_dir) / 'parameters.py', locations)
+		parameters_loc = str(Path(temp_dir) / 'parameters.py')
+
+		cases = {
+			'help': ['--help'],
+			'dry_run': [parameters_loc, '-nf', '-o', '--dry-run'],
+			'questions_only': [parameters_loc, '-nf', '-ns', '-nc', '-o'],
+		}
+
+		for case, case_args in cases.items():
+			wall, imports = timed_runs(case_args, args.repeat)
+			heavy = [module for module in heavy_modules if module in imports]
+			records.append({'benchmark': 'startup', 'case': case, 'wall_seconds': round(wall, 4), 'heavy_imports': heavy, 'imports': imports})
+
+			print("%-15s %8.3fs  heavy imports: %s" % (case, wall, ', '.join(heavy) or 'none'))
+			for module, seconds in sorted(imports.items(), key = lambda item: -item[1])[:args.top]:
+				print("  %-30s %8.3fs" % (module, seconds))
+
+	if args.output:
+		with open(args.output, 'a') as file:
+			for record in records:
+				file.write(json.dumps(record) + '\n')
+		print("Results appended to " + args.output + ".")
@@ -0,0 +1,79 @@
+##############################################################################################
+###### Benchmark for pivoting results to wide format: in memory, in chunks, pivot_table ######
+##############################################################################################
+
+# Writes a long results.csv shaped like SideEye's (a row for each trial measure, then a row for each region measure of each region),
+# then times pivoting it to wide with WidePivot in memory and a chunk at a time, checking that both write the same file
+# pandas.pivot_table (roughly what pivoting the long output afterwards in R does) is timed as well, for comparison
+
+import os, sys, time, random, argparse, tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from prasc_lib.combine import WidePivot, load_results, combine_in_chunks, default_trial_measures, region_fields
+
+region_measures = ['skip', 'first_pass_regressions_out', 'first_pass_regressions_in', 'first_fixation_duration', 'single_fixation_duration', 'first_pass',
+	'go_past', 'total_time', 'right_bounded_time', 'reread_time', 'second_pass', 'spillover_time', 'refixation_time', 'landing_position', 'launch_site', 'first_pass_fixation_count']
+header = ['experiment_name', 'filename', 'date', 'trial_id', 'trial_total_time', 'item_id', 'item_condition'] + region_fields + ['measure', 'value']
+
+# Write out a long results.csv for participants who each read items trials with regions regions
+def write_long_results(loc, participants, items, regions, seed = 0):
+	rng = random.Random(seed)
+	with open(loc, 'w') as file:
+		file.write(','.join(header) + '\n')
+		for participant in range(participants):
+			name = 'subj%03d' % participant
+			trial_cols = '%s,/data/%s.asc,2024-01-01 00:00:00,' % (name, name)
+			for trial in range(items):
+				total = rng.randint(2000, 6000)
+				trial_start = trial_cols + '%d,%d,%d,%d,' % (trial, total, trial + 1, trial % 4 + 1)
+				for measure in default_trial_measures:
+					file.write(trial_start + 'NA,NA,NA,NA,NA,%s,%d\n' % (measure, rng.randint(0, 500)))
+				for region in range(regions):
+					region_start = trial_start + '%d,%d,word%d ,"(%d, 0)","(%d, 0)",' % (region, region, region, region * 10, region * 10 + 10)
+					for measure in region_measures:
+						value = rng.choice(['None', 'False', 'True']) if measure == 'skip' else str(rng.randint(0, 800))
+						file.write(region_start + '%s,%s\n' % (measure, value))
+
+def timed(func, *args):
+	start = time.perf_counter()
+	result = func(*args)
+	return result, time.perf_counter() - start
+
+def pivot_in_memory(csv_loc, pivot, out_loc):
+	pivot(load_results(csv_loc, 'utf-8', {field: {} for field in header})).to_csv(out_loc, index = False, na_rep = 'NA')
+
+def pivot_table(csv_loc):
+	import pandas
+	results = pandas.read_csv(csv_loc)
+	regions = results[results['measure'].isin(region_measures)]
+	return regions.pivot_table(index = [col for col in header if not col in ('measure', 'value')], columns = 'measure', values = 'value', aggfunc = 'first', observed = True)
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser()
+	parser.add_argument('-p', '--participants', type = int, default = 40, help = "Number of participants.")
+	parser.add_argument('-i', '--items', type = int, default = 120, help = "Number of trials per participant.")
+	parser.add_argument('-r', '--regions', type = int, default = 8, help = "Number of regions per trial.")
+	parser.add_argument('-c', '--chunksize', type = int, default = 100000, help = "Rows per chunk when pivoting in chunks.")
+	parser.add_argument('--no-pivot-table', default = False, action = 'store_true', help = "Don't time pandas.pivot_table, which is slow on large results.")
+	args = parser.parse_args()
+
+	pivot = WidePivot('measure', 'value', default_trial_measures, region_measures, region_fields)
+	with tempfile.TemporaryDirectory(prefix = 'prASC_bench_') as temp_dir:
+		csv_loc = Path(temp_dir) / 'results.csv'
+		write_long_results(csv_loc, args.participants, args.items, args.regions)
+		print("results.csv: %.1f MB" % (os.path.getsize(csv_loc) / (1024 * 1024)))
+
+		_, memory_seconds = timed(pivot_in_memory, csv_loc, pivot, Path(temp_dir) / 'memory.csv')
+		_, chunk_seconds = timed(combine_in_chunks, csv_loc, 'utf-8', None, None, [], Path(temp_dir) / 'chunks.csv', args.chunksize, pivot)
+		with open(Path(temp_dir) / 'memory.csv', 'rb') as memory, open(Path(temp_dir) / 'chunks.csv', 'rb') as chunks:
+			if memory.read() != chunks.read():
+				print("Error: pivoting in memory and in chunks wrote different files. Exiting...")
+				sys.exit(1)
+
+		print("WidePivot in memory:     %8.3fs" % memory_seconds)
+		print("WidePivot in chunks:     %8.3fs (%d rows per chunk)" % (chunk_seconds, args.chunksize))
+		if not args.no_pivot_table:
+			_, table_seconds = timed(pivot_table, csv_loc)
+			print("pandas.pivot_table:      %8.3fs (region measures only)" % table_seconds)
@@ -0,0 +1,51 @@
+##############################################################################################
+###### A stand-in for Rscript that "fix aligns" ASCs by copying them, for benchmarks #########
+##############################################################################################
+
+# Reads the fix_align call prASC.py writes at the end of its script, and copies each ASC to fa_dir as _fa.asc
+# along with a summary file, the way fix_align would. ASCs with 'bad' in their name fail, so error handling can be tried out
+# If the script is an R worker script (see prasc_lib/fix_align.py), it runs jobs from stdin the way an R worker would
+# FAKE_RSCRIPT_STARTUP sets how long to sleep on start up (in seconds), to stand in for R loading
+
+import os, re, sys, time, shutil
+
+worker_marker = 'prASC_JOB_DONE'
+
+def fix_align(script):
+	call = script[script.rindex('fix_align('):]
+	files = re.findall(r'"([^"]+)"', re.search(r'asc_files = c\(([^)]*)\)', call).group(1))
+	fa_dir = re.search(r'fa_dir = "([^"]+)"', call).group(1)
+
+	rows = []
+	for file in files:
+		print('Processing ' + os.path.basename(file) + '...', flush = True)
+		if 'bad' in os.path.basename(file):
+			raise ValueError("Error in fix_align: unable to fit " + os.path.basename(file))
+		shutil.copy(file, os.path.join(fa_dir, re.sub(r'\.asc$', '_fa.asc', os.path.basename(file))))
+		rows.append(os.path.basename(file) + '\t1\n')
+
+	with open(os.path.join(fa_dir, time.strftime('%Y-%m-%d %H;%M;%S') + '.fas'), 'w') as summary:
+		summary.write('file\ttrial\n' + ''.join(rows))
+
+if __name__ == '__main__':
+	with open(sys.argv[-1], 'r') as file:
+		script = file.read()
+
+	time.sleep(float(os.environ.get('FAKE_RSCRIPT_STARTUP', '0')))
+
+	if worker_marker in script:
+		for job in sys.stdin:
+			with open(job.strip(), 'r') as file:
+				try:
+					fix_align(file.read())
+					status = 'OK'
+				except Exception as e:
+					status = 'ERROR ' + str(e)
+			print('\n' + worker_marker + ' ' + status, flush = True)
+		sys.exit(0)
+
+	try:
+		fix_align(script)
+	except Exception as e:
+		sys.stderr.write(str(e) + '\n')
+		sys.exit(1)
@@ -0,0 +1,150 @@
+##############################################################################################
+########### Synthetic EyeLink ASCs, sentences.txt, and stimuli files for benchmarks ##########
+##############################################################################################
+
+import os, sys, csv, stat, random, argparse
+from pathlib import Path
+
+words = "the cat sat on a mat while dogs ran far away from home and nobody saw them go".split()
+
+# Pixel layout of the sentence on the screen
+char_width = 12
+left_margin = 100
+top = 350
+bottom = 400
+
+# Get the regions of the sentence for an item in a condition. Each condition gets its own words, so the conditions differ
+def item_regions(item, condition, regions = 4, words_per_region = 2):
+	rng = random.Random(item * 1000 + condition)
+	return [' '.join(rng.choice(words) for _ in range(words_per_region)) for _ in range(regions)]
+
+# Write a sentences.txt for SideEye, with a line for each item in each condition and regions separated by slashes
+def write_sentences(loc, items, conditions, regions = 4):
+	with open(loc, 'w') as file:
+		for item in range(1, items + 1):
+			for condition in range(1, conditions + 1):
+				file.write('%d %d %s\n' % (item, condition, ' /'.join(item_regions(item, condition, regions))))
+
+# Write a stimuli file like the one scriptR makes, with a row for each item in each condition
+def write_stimuli(loc, items, conditions, regions = 4):
+	with open(loc, 'w', newline = '') as file:
+		writer = csv.writer(file)
+		writer.writerow(['item_id', 'item_condition', 'sentence', 'cond_name'])
+		for item in range(1, items + 1):
+			for condition in range(1, conditions + 1):
+				writer.writerow([item, condition, ' '.join(item_regions(item, condition, regions)), 'cond' + str(condition)])
+
+# Write an ASC for one participant, who sees every item once, in a condition rotated across participants (a Latin square)
+# Each trial has the character regions SideEye reads the sentence from, fixations moving left to right across it,
+# and (with probability questions) a comprehension question
+def write_asc(loc, participant, items, conditions, fixations = 20, questions = 0.5, regions = 4, seed = 0):
+	rng = random.Random(seed * 100003 + participant)
+	order = list(range(1, items + 1))
+	rng.shuffle(order)
+
+	t = 1000
+	with open(loc, 'w') as asc:
+		asc.write('** CONVERTED FROM synthetic.edf using edfapi\n')
+		asc.write('** DATE: Mon Jan  1 00:00:00 2024\n')
+		for item in order:
+			condition = (item + participant) % conditions + 1
+			text = ' '.join(item_regions(item, condition, regions))
+
+			asc.write('MSG\t%d TRIALID E%dI%dD0\n' % (t, condition, item))
+			for i, char in enumerate(text):
+				x = left_margin + i * char_width
+				asc.write('MSG\t%d REGION CHAR %d 1 %s %d %d %d %d\n' % (t, i, '_' if char == ' ' else char, x, top, x + char_width, bottom))
+			t = t + 10
+			asc.write('MSG\t%d SYNCTIME\n' % t)
+
+			for n in range(fixations):
+				x = left_margin + n * len(text) * char_width / fixations + rng.uniform(0, 6)
+				y = (top + bottom) / 2 + rng.uniform(-8, 8)
+				duration = rng.randint(80, 300)
+				asc.write('SFIX R   %d\n' % t)
+				# A few samples per fixation, so the files have roughly the mix of lines a real recording has
+				for sample in range(0, duration, 50):
+					asc.write('%d\t  %.1f\t  %.1f\t 1000.0\t...\n' % (t + sample, x, y))
+				asc.write('EFIX R   %d\t%d\t%d\t  %.1f\t  %.1f\t   1000\n' % (t, t + duration, duration, x, y))
+				t = t + duration + 30
+
+			if rng.random() < questions:
+				asc.write('MSG\t%d QUESTION_ANSWER %d\n' % (t, rng.randint(1, 2)))
+			asc.write('MSG\t%d TRIAL_RESULT %d\n' % (t, rng.randint(1, 2)))
+			t = t + 500
+
+# Write a complete synthetic experiment to exp_dir: ASC/, sentences.txt, stimuli-formatted.csv, and a copy of config.json
+# Returns the locations of the files, for writing a parameters file
+def make_experiment(exp_dir, participants = 4, items = 16, conditions = 4, fixations = 20, questions = 0.5, regions = 4, seed = 0, config_json_loc = None):
+	exp_dir = Path(exp_dir)
+	asc_dir = exp_dir / 'ASC'
+	os.makedirs(asc_dir, exist_ok = True)
+
+	write_sentences(exp_dir / 'sentences.txt', items, conditions, regions)
+	write_stimuli(exp_dir / 'stimuli-formatted.csv', items, conditions, regions)
+	for participant in range(participants):
+		write_asc(asc_dir / ('subj%03d.asc' % participant), participant, items, conditions, fixations, questions, regions, seed)
+
+	if config_json_loc is None:
+		config_json_loc = Path(__file__).resolve().parents[1] / 'config.json'
+	with open(config_json_loc, 'r') as source, open(exp_dir / 'config.json', 'w') as config:
+		config.write(source.read())
+
+	return {
+		'asc_files_dir': asc_dir,
+		'config_json_loc': exp_dir / 'config.json',
+		'sentences_txt_loc': exp_dir / 'sentences.txt',
+		'stimuli_loc': exp_dir / 'stimuli-formatted',
+		'output_dir': exp_dir / 'prASCed results',
+	}
+
+# Write a parameters file for prASC.py. fix_align_loc only has to exist when fix_align is mocked by the stand-in Rscript
+def write_parameters(loc, locations, fix_align_loc = None):
+	with open(loc, 'w') as file:
+		for name, value in locations.items():
+			file.write('%s = %r\n' % (name, str(value)))
+		if fix_align_loc is not None:
+			file.write('fix_align_loc = %r\n' % str(fix_align_loc))
+			file.write('start_pts = "rbind(c(%d, %d))"\n' % (left_margin, (top + bottom) // 2))
+
+# Put an executable named Rscript in bin_dir that runs fake_rscript.py, and an empty fix_align file for it to "load"
+# Put bin_dir at the front of PATH to run prASC.py's fix_align stage without R
+# Returns the location of the fix_align file
+def install_fake_rscript(bin_dir):
+	bin_dir = Path(bin_dir)
+	os.makedirs(bin_dir, exist_ok = True)
+
+	rscript_loc = bin_dir / ('Rscript.bat' if os.name == 'nt' else 'Rscript')
+	fake_loc = Path(__file__).resolve().parent / 'fake_rscript.py'
+	with open(rscript_loc, 'w') as file:
+		if os.name == 'nt':
+			file.write('@"%s" "%s" %%*\n' % (sys.executable, fake_loc))
+		else:
+			file.write('#!/bin/sh\nexec "%s" "%s" "$@"\n' % (sys.executable, fake_loc))
+	os.chmod(rscript_loc, os.stat(rscript_loc).st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+
+	fix_align_loc = bin_dir / 'fix_align_fake.r'
+	with open(fix_align_loc, 'w') as file:
+		file.write('fix_align <- function(...) NULL\n')
+
+	return fix_align_loc
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description = "Write a synthetic experiment (ASCs, sentences.txt, stimuli file, config.json, and a parameters file) for trying out prASC.py.")
+	parser.add_argument('exp_dir', help = "Directory to write the experiment to.")
+	parser.add_argument('-p', '--participants', type = int, default = 4, help = "Number of participants (ASC files).")
+	parser.add_argument('-i', '--items', type = int, default = 16, help = "Number of items (trials per participant).")
+	parser.add_argument('-c', '--conditions', type = int, default = 4, help = "Number of conditions per item.")
+	parser.add_argument('-f', '--fixations', type = int, default = 20, help = "Number of fixations per trial.")
+	parser.add_argument('-q', '--questions', type = float, default = 0.5, help = "Proportion of trials with a comprehension question (0 for none).")
+	parser.add_argument('--seed', type = int, default = 0, help = "Random seed.")
+	parser.add_argument('--fake-rscript', default = False, action = 'store_true', help = "Also install a stand-in Rscript in exp_dir/bin, for running fix_align without R.")
+	args = parser.parse_args()
+
+	locations = make_experiment(args.exp_dir, args.participants, args.items, args.conditions, args.fixations, args.questions, seed = args.seed)
+	fix_align_loc = install_fake_rscript(Path(args.exp_dir) / 'bin') if args.fake_rscript else None
+	write_parameters(Path(args.exp_dir) / 'parameters.py', locations, fix_align_loc)
+
+	print("Wrote a synthetic experiment with %d participants and %d items to %s." % (args.participants, args.items, args.exp_dir))
+	if fix_align_loc is not None:
+		print("Put %s at the front of PATH to use the stand-in Rscript." % (Path(args.exp_dir) / 'bin'))
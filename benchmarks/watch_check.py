@@ -0,0 +1,79 @@
+##############################################################################################
+############### Checking that --watch notices ASCs copied into a temp directory ##############
+##############################################################################################
+
+# Runs an AscWatcher on an empty temp directory (how data collection starts) and copies synthetic ASCs into it, checking that
+# nothing is processed while the directory is empty or an ASC is still changing, and that new and changed ASCs are picked up once
+# they settle. Time is passed in rather than waited for, so it runs instantly
+# Then runs watch() itself on a synthetic experiment whose ASC directory starts out empty, with fix_align mocked by the stand-in
+# Rscript, checking that it waits for an ASC instead of exiting, and processes it once it's copied in. Exits with status 1 if a check fails
+
+import os, sys, time, tempfile, threading
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from synthetic import write_asc, make_experiment, write_parameters, install_fake_rscript
+from prasc_lib.pipeline import Options
+from prasc_lib.watch import AscWatcher, watch
+
+failures = []
+
+def check(description, ok):
+	print("%-60s %s" % (description, 'ok' if ok else 'FAILED'))
+	if not ok:
+		failures.append(description)
+
+if __name__ == '__main__':
+	settle = 5
+	with tempfile.TemporaryDirectory(prefix = 'prASC_watch_') as temp_dir:
+		watcher = AscWatcher(temp_dir, settle)
+		check("empty directory: nothing to do", watcher.poll(0) is None)
+		check("still empty after settling: nothing to do", watcher.poll(settle + 1) is None)
+
+		write_asc(Path(temp_dir) / 's0.asc', 0, 4, 2)
+		# Hidden files are partial copies, and are left alone
+		write_asc(Path(temp_dir) / '.s1.asc.part', 1, 4, 2)
+		check("new ASC: waits for it to settle", watcher.poll(10) is None)
+		check("new ASC: still settling", watcher.poll(10 + settle - 1) is None)
+		snapshot = watcher.poll(10 + settle)
+		check("new ASC: processed once settled", snapshot is not None and watcher.changed(snapshot) == ['s0.asc'])
+		watcher.mark_processed(snapshot)
+		check("processed: nothing to do", watcher.poll(30) is None)
+
+		write_asc(Path(temp_dir) / 's1.asc', 1, 4, 2)
+		with open(Path(temp_dir) / 's0.asc', 'a') as file:
+			file.write('MSG 999999 extra line\n')
+		watcher.poll(40)
+		snapshot = watcher.poll(40 + settle)
+		check("new and changed ASCs: both processed", snapshot is not None and watcher.changed(snapshot) == ['s0.asc', 's1.asc'])
+		watcher.mark_processed(snapshot)
+
+		for f in os.listdir(temp_dir):
+			os.remove(Path(temp_dir) / f)
+		watcher.poll(60)
+		check("emptied again: nothing to do", watcher.poll(60 + settle) is None)
+
+	with tempfile.TemporaryDirectory(prefix = 'prASC_watch_') as temp_dir:
+		locations = make_experiment(Path(temp_dir) / 'exp', participants = 0, items = 4, conditions = 2)
+		fix_align_loc = install_fake_rscript(Path(temp_dir) / 'bin')
+		os.environ['PATH'] = str(Path(temp_dir) / 'bin') + os.pathsep + os.environ.get('PATH', '')
+		parameters_loc = Path(temp_dir) / 'exp' / 'parameters.py'
+		write_parameters(parameters_loc, locations, fix_align_loc)
+
+		rounds = []
+		watcher = threading.Thread(target = lambda: rounds.append(watch(parameters_loc, Options(), interval = 0.05, settle = 0.2, rounds = 1)), daemon = True)
+		watcher.start()
+		time.sleep(1)
+		check("watch() on an empty directory: keeps waiting", watcher.is_alive())
+
+		write_asc(Path(locations['asc_files_dir']) / 'subj000.asc', 0, 4, 2)
+		watcher.join(120)
+		check("watch() on an empty directory: processes the first ASC", rounds == [1])
+		check("watch() on an empty directory: fix aligned it", os.path.isfile(Path(locations['asc_files_dir']) / 'Fix Aligned' / 'subj000_fa.asc'))
+		check("watch() on an empty directory: combined results", os.path.isfile(Path(locations['output_dir']) / 'results_combined.csv'))
+
+	if failures:
+		print("Error: " + str(len(failures)) + " watch check(s) failed. Exiting...")
+		sys.exit(1)
+	print("All watch checks passed.")
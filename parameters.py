@@ -7,6 +7,9 @@
 # fa_output_dir: the filepath to where you want to output the fix aligned ASCs. ######################################
 ###### Default is %current_dir%/ASC/Fix Aligned/. Required if processing ASCs with fix_align. ########################
 ######################################################################################################################
+# fa_compression: (optional) write fix aligned ASCs compressed, as gz, zst (needs 'pip install zstandard'), or xz. ###
+###### Default is to write them uncompressed. ASC files can also be read compressed (e.g. subj1.asc.gz). #############
+######################################################################################################################
 # script_loc: (optional) the location of a script file that contains start_pts information. ##########################
 ###### Default is %current_dir%/*.script. If not included (or if start_pts are not in the script), ###################
 ###### start_pts must be specified here or upon running prASC.py if you are fix aligning ASCs. #######################
@@ -33,10 +36,15 @@
 # output_dir: the directory where you want to output the results. ####################################################
 ###### Default is %current_dir%/prASCed results. Required if doing anything other than running fix_align. ############
 ######################################################################################################################
+# cache_dir: (optional) the directory where ASCs parsed by SideEye are cached, so they are only parsed again #########
+###### if they, sentences.txt, or the asc_parsing settings in config.json change. ####################################
+###### Default is %output_dir%/.prASC cache. Use '--nocache' to skip the cache. ######################################
+######################################################################################################################
 
 asc_files_dir = "ASC"
 
 #fa_output_dir = "ASC/Fix Aligned"
+#fa_compression = "gz"
 #script_loc = "Resources"
 fix_align_loc = "fix_align_v0p92"
 
@@ -47,6 +55,7 @@ sentences_txt_loc = "sentences"
 #file_encoding = 'latin1'
 
 output_dir = "prASCed results"
+#cache_dir = "prASCed results/.prASC cache"
 
 ######################################################################################################################
 # The following parameters are optionally set to be passed to the fix_align call. ####################################
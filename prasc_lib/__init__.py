@@ -0,0 +1 @@
+# Helper functions for prASC.py, kept importable so they can be reused and benchmarked
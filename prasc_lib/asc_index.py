@@ -0,0 +1,115 @@
+##############################################################################################
+################### Index of the trial markers in ASC files, kept next to them ###############
+##############################################################################################
+
+# Finding the TRIALID/SYNCTIME, QUESTION_ANSWER, and TRIAL_RESULT messages in an ASC means reading through every sample and fixation
+# Instead, the file is memory mapped and searched for each marker (which runs at the speed of memchr, rather than a line at a time in Python),
+# and the byte offset, timestamp, and text of each message line with a marker is saved next to the ASC
+# Later runs read the index instead of the ASC, and anything that needs only some trials can seek straight to them with trial_ranges and read_trial
+# Indexes are rebuilt when the size or modification time of their ASC changes
+# Compressed ASCs (see compressed.py) are decompressed into memory to be searched, and their offsets are into the decompressed text
+
+import os, re, json, mmap, locale
+from pathlib import Path
+
+from .cache import atomic_open
+from .compressed import compression, uncompressed_name, open_asc
+
+index_version = 1
+markers = ['TRIALID', 'SYNCTIME', 'QUESTION_ANSWER', 'TRIAL_RESULT']
+
+# The index is named after the ASC without .asc, since anything with .asc in its name is taken to be an ASC file
+# Compressed ASCs keep their compression extension (e.g. subj1.gz.prasc-trials.json), so they don't share an index with a plain ASC of the same name
+def index_loc(asc_loc):
+	asc_loc = Path(asc_loc)
+	kind = compression(asc_loc)
+	name = re.sub(r'\.asc$', '', uncompressed_name(asc_loc.name), flags = re.IGNORECASE) + ('.' + kind if kind else '')
+	return asc_loc.parent / (name + '.prasc-trials.json')
+
+# Find the start of each message line (one starting with MSG) that has a marker anywhere in it, which is how the question scoring has always found them
+def marker_lines(data):
+	starts = set()
+	for marker in markers:
+		marker = marker.encode('ascii')
+		position = data.find(marker)
+		while position != -1:
+			start = data.rfind(b'\n', 0, position) + 1
+			if data[start:start + 3] == b'MSG':
+				starts.add(start)
+			position = data.find(marker, position + len(marker))
+	return sorted(starts)
+
+# Search an ASC for its marker lines. Returns a list of [byte offset, timestamp, marker, line] for each one, in the order they're in the file
+# The marker is the first one in the line. The line is decoded the same way the file would be read as text, without its line ending
+def build_index(asc_loc):
+	if compression(asc_loc) is not None:
+		with open_asc(asc_loc, 'rb') as file:
+			return index_entries(file.read())
+
+	with open(asc_loc, 'rb') as file:
+		if os.fstat(file.fileno()).st_size == 0:
+			return []
+		with mmap.mmap(file.fileno(), 0, access = mmap.ACCESS_READ) as data:
+			return index_entries(data)
+
+# Get the index entries for the text of an ASC (as bytes or a memory map)
+def index_entries(data):
+	encoding = locale.getpreferredencoding(False)
+	entries = []
+	for start in marker_lines(data):
+		end = data.find(b'\n', start)
+		line = data[start:end if end != -1 else len(data)].rstrip(b'\r').decode(encoding, errors = 'replace')
+		fields = line.split()
+		timestamp = int(fields[1]) if len(fields) > 1 and fields[1].isdigit() else None
+		first_marker = min((line.find(marker), marker) for marker in markers if marker in line)[1]
+		entries.append([start, timestamp, first_marker, line])
+	return entries
+
+# Get the index for an ASC, from the file next to it if it's up to date, or by building it (and saving it, if save is set)
+# If the index can't be saved (e.g., the ASCs are on a read only drive), it's still returned
+def load_index(asc_loc, save = True):
+	stat = os.stat(asc_loc)
+	loc = index_loc(asc_loc)
+	try:
+		with open(loc, 'r') as file:
+			index = json.load(file)
+		if index.get('version') == index_version and index.get('size') == stat.st_size and index.get('mtime') == stat.st_mtime_ns:
+			return index['entries']
+	except (OSError, ValueError):
+		pass
+
+	entries = build_index(asc_loc)
+	if save:
+		try:
+			with atomic_open(loc) as file:
+				json.dump({'version': index_version, 'size': stat.st_size, 'mtime': stat.st_mtime_ns, 'entries': entries}, file)
+		except OSError:
+			pass
+	return entries
+
+# Get the byte range of each trial in an ASC, from one start_flag message to the next (or the end of the file)
+# Returns a list of (trial id, start offset, end offset), where the trial id is the one in the TRIALID message (e.g. E1I2D0)
+# Trials that start at SYNCTIME get the id of the TRIALID message before them
+# The last trial ends at None for compressed ASCs, since their decompressed size isn't known without reading them
+def trial_ranges(asc_loc, start_flag = 'TRIALID', save = True):
+	entries = load_index(asc_loc, save)
+	size = os.path.getsize(asc_loc) if compression(asc_loc) is None else None
+
+	starts = []
+	trial_id = None
+	for offset, timestamp, marker, line in entries:
+		if marker == 'TRIALID':
+			fields = line.split()
+			trial_id = fields[3] if len(fields) > 3 else None
+		if marker == start_flag:
+			starts.append((trial_id, offset))
+
+	return [(trial_id, offset, starts[i + 1][1] if i + 1 < len(starts) else size) for i, (trial_id, offset) in enumerate(starts)]
+
+# Read the text of one trial from a range from trial_ranges, without reading the rest of the file
+# Compressed ASCs have to be decompressed up to start to seek to it, but nothing after the trial is read
+def read_trial(asc_loc, start, end, encoding = None):
+	with open_asc(asc_loc, 'rb') as file:
+		file.seek(start)
+		data = file.read(end - start if end is not None else -1)
+	return data.decode(encoding or locale.getpreferredencoding(False), errors = 'replace')
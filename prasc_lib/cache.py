@@ -0,0 +1,66 @@
+##############################################################################################
+################## Content hashes and manifests for skipping unchanged work ##################
+##############################################################################################
+
+import os, re, json, hashlib, tempfile
+from contextlib import contextmanager
+
+# Hash the contents of a file in blocks, so large ASCs don't have to be read into memory
+def file_hash(loc, block_size = 1 << 20):
+	h = hashlib.sha256()
+	with open(loc, 'rb') as file:
+		for block in iter(lambda: file.read(block_size), b''):
+			h.update(block)
+	return h.hexdigest()
+
+# Hash a set of parameters. Whitespace in string values is ignored, since 'c(-.1, .1)' and 'c(-.1,.1)' mean the same thing to R
+def params_hash(params):
+	normalized = {key: re.sub(r'\s+', '', value) if isinstance(value, str) else value for key, value in params.items()}
+	return hashlib.sha256(json.dumps(normalized, sort_keys = True, default = str).encode('utf-8')).hexdigest()
+
+# Get the hash, size, and modification time of a file
+# If the size and modification time match those in entry, the file hasn't been touched, so its old hash is reused instead of rereading it
+def file_fingerprint(loc, entry = None):
+	stat = os.stat(loc)
+	if entry and entry.get('size') == stat.st_size and entry.get('mtime') == stat.st_mtime_ns and 'hash' in entry:
+		file_hash_value = entry['hash']
+	else:
+		file_hash_value = file_hash(loc)
+	return {'hash': file_hash_value, 'size': stat.st_size, 'mtime': stat.st_mtime_ns}
+
+def load_manifest(loc):
+	try:
+		with open(loc, 'r') as file:
+			return json.load(file)
+	except (OSError, ValueError):
+		return {}
+
+# The umask, read once when this is imported (it can only be read by setting it, which isn't safe once other threads are running)
+umask = os.umask(0)
+os.umask(umask)
+
+# Give a temp file made by tempfile.mkstemp (which only its owner can read) the permissions a file made with open would have
+# Files are moved into place with their permissions, so without this, others in a shared lab directory couldn't read them
+def default_permissions(loc):
+	os.chmod(loc, 0o666 & ~umask)
+
+# Write to a uniquely named temp file next to loc, then move it into place
+# This way an interrupted run can't leave a half-written file, and worker processes writing the same file can't clobber each other's temp files
+@contextmanager
+def atomic_open(loc, mode = 'w'):
+	fd, tmp_loc = tempfile.mkstemp(dir = os.path.dirname(os.path.abspath(loc)), prefix = '.tmp_')
+	try:
+		with os.fdopen(fd, mode) as file:
+			yield file
+		default_permissions(tmp_loc)
+		os.replace(tmp_loc, loc)
+	except BaseException:
+		try:
+			os.remove(tmp_loc)
+		except OSError:
+			pass
+		raise
+
+def save_manifest(manifest, loc):
+	with atomic_open(loc) as file:
+		json.dump(manifest, file, indent = 1, sort_keys = True)
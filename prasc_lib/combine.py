@@ -0,0 +1,297 @@
+##############################################################################################
+################### Helpers for combining results, questions, and stimuli ####################
+##############################################################################################
+
+import io, numpy, pandas
+
+# SideEye output fields that repeat the same few strings on many rows, which are much smaller as categories
+label_fields = ['experiment_name', 'filename', 'date', 'region_text', 'measure']
+# SideEye output fields that are usually whole numbers, which fit in smaller types than int64 or float64 (other values are left alone)
+id_fields = ['trial_id', 'trial_total_time', 'item_id', 'item_condition', 'region_label', 'region_number', 'region_start', 'region_end']
+
+# SideEye output fields that are only set on the rows for region measures
+region_fields = ['region_label', 'region_number', 'region_text', 'region_start', 'region_end']
+# The trial measures SideEye calculates if config.json doesn't list them
+default_trial_measures = ['location_first_regression', 'latency_first_regression', 'fixation_count', 'percent_regressions', 'trial_total_time', 'average_forward_saccade', 'average_backward_saccade']
+
+# Get the headers used for a list of fields from the region_output and trial_output settings in config.json
+def field_headers(fields, *outputs):
+	headers = []
+	for output in outputs:
+		for field in fields:
+			if field in output:
+				header = output[field]['header'] if isinstance(output[field], dict) and 'header' in output[field] else field
+				if not header in headers:
+					headers.append(header)
+	return headers
+
+# Read in results.csv with smaller types than pandas' defaults: categories for repeated labels, and the smallest types that fit the ids
+# The ids can't be given a type up front, since they are missing on some rows. Whole numbers are still written out the same way
+def load_results(csv_loc, encoding, *outputs):
+	columns = pandas.read_csv(csv_loc, nrows = 0, encoding = encoding).columns
+	dtypes = {header: 'category' for header in field_headers(label_fields, *outputs) if header in columns}
+	results = pandas.read_csv(csv_loc, encoding = encoding, dtype = dtypes)
+
+	for header in field_headers(id_fields, *outputs):
+		if header in results.columns:
+			if pandas.api.types.is_integer_dtype(results[header]):
+				results[header] = pandas.to_numeric(results[header], downcast = 'integer')
+			elif pandas.api.types.is_float_dtype(results[header]):
+				results[header] = pandas.to_numeric(results[header], downcast = 'float')
+
+	return results
+
+# Check that the columns in stimuli can be used to combine it with results
+# Each value must be present and a whole number, and every value in results must also be in stimuli
+# Returns a report with the problems found in each column (missing values are given by row number in the stimuli file, not counting the header). Columns with no problems are left out, so an empty report means the stimuli are fine
+def validate_stimuli(stimuli, results, columns):
+	report = {}
+	for col in columns:
+		values = stimuli[col]
+		missing = values.isna()
+
+		# Numeric columns can't have blanks or text, so only negative numbers and fractions need to be checked for
+		# (whole numbers are read in as floats if there are missing values)
+		if pandas.api.types.is_numeric_dtype(values):
+			invalid = ~missing & ((values < 0) | (values % 1 != 0))
+		else:
+			invalid = ~missing & ~values.astype(str).str.fullmatch(r'[0-9]+')
+
+		problems = {}
+		if missing.any():
+			problems['missing'] = [row + 1 for row in missing.to_numpy().nonzero()[0].tolist()]
+		if invalid.any():
+			problems['invalid'] = values[invalid].unique().tolist()
+
+		# If there are bad values, the column won't have been read in as numbers, so nothing in results would match anyway
+		if not problems:
+			results_values = pandas.Series(results[col].dropna().unique())
+			unmatched = results_values[~results_values.isin(values.unique())]
+			if len(unmatched):
+				problems['unmatched'] = sorted(unmatched.tolist(), key = str)
+
+		if problems:
+			report[col] = problems
+
+	return report
+
+# Describe the problems with a column from validate_stimuli's report
+def describe_problems(problems, max_shown = 10):
+	def shown(values):
+		text = ', '.join(repr(value) if isinstance(value, str) else str(value) for value in values[:max_shown])
+		return text + (', ...' if len(values) > max_shown else '')
+
+	descriptions = []
+	if 'missing' in problems:
+		descriptions.append('missing in rows ' + shown(problems['missing']))
+	if 'invalid' in problems:
+		descriptions.append('not whole numbers: ' + shown(problems['invalid']))
+	if 'unmatched' in problems:
+		descriptions.append('in results but not stimuli: ' + shown(problems['unmatched']))
+	return '; '.join(descriptions)
+
+# Get the keys that have more than one row in table, which would multiply the rows of whatever it's joined onto
+def duplicated_keys(table, keys):
+	duplicated = table.loc[table.duplicated(keys, keep = False), keys].drop_duplicates()
+	return list(duplicated.itertuples(index = False, name = None))
+
+# Describe keys from duplicated_keys, e.g. "(1, 2), (3, 1)"
+def describe_keys(keys, max_shown = 10):
+	text = ', '.join('(' + ', '.join(str(value) for value in key) + ')' for key in keys[:max_shown])
+	return text + (', ...' if len(keys) > max_shown else '')
+
+# A table to left join onto results by key columns: the stimuli by item id and condition, or the questions by filename and item id
+# It's indexed on the keys once, so joining it onto all of results, or onto each chunk of results, doesn't hash it again
+# It must have only one row for each key (see duplicated_keys), so joining can't add rows to results. Joining raises pandas.errors.MergeError if it doesn't
+# Other columns it shares with results are kept, with name added to the end of their names in the lookup
+class Lookup:
+	def __init__(self, table, keys, name):
+		self.keys = list(keys)
+		self.table = table.set_index(self.keys)
+		self.suffix = '_' + name
+
+	def join(self, results):
+		return results.join(self.table, on = self.keys, how = 'left', rsuffix = self.suffix, validate = 'many_to_one')
+
+# Pivot results from long format (a row for each measure) to wide (a row for each region of each trial, with a column for each measure)
+# Trial measures are put on every row of their trial, as SideEye does when it writes wide output itself
+# Rows are kept in the order of their first measure, and the trial measures come before the region measures, in the order they're in results
+# Measure columns are named with the headers in config.json (headers, by measure), like SideEye's wide output
+# Pivoting raises ValueError if some region or trial has more than one value for a measure (e.g. if the same ASC is in results twice)
+class WidePivot:
+	def __init__(self, measure_col, value_col, trial_measures, region_measures, region_cols, headers = {}):
+		self.measure_col = measure_col
+		self.value_col = value_col
+		self.trial_measures = list(trial_measures)
+		self.region_measures = list(region_measures)
+		self.region_cols = list(region_cols)
+		self.headers = dict(headers)
+
+	# Whether a table of results is in long format, rather than wide (e.g. if SideEye already wrote it out wide)
+	# Only the region measures are looked for, since some trial measures (like trial_total_time) are also output fields
+	def is_long(self, columns):
+		return self.measure_col in columns and self.value_col in columns and not any(self.headers.get(measure, measure) in columns for measure in self.region_measures)
+
+	def id_cols(self, results):
+		return [col for col in results.columns if not col in (self.measure_col, self.value_col)]
+
+	def trial_cols(self, results):
+		return [col for col in self.id_cols(results) if not col in self.region_cols]
+
+	# dtypes gives the types to give the measure columns (e.g. the ones they'd have if all of results were pivoted at once, see measure_dtype)
+	def __call__(self, results, dtypes = {}):
+		id_cols = self.id_cols(results)
+		trial_cols = self.trial_cols(results)
+		is_trial = results[self.measure_col].isin(self.trial_measures).to_numpy()
+		trials = pivot_rows(results[is_trial], trial_cols, self.measure_col, self.value_col, self.headers)
+		regions = pivot_rows(results[~is_trial], id_cols, self.measure_col, self.value_col, self.headers)
+		wide = Lookup(trials, trial_cols, 'trial').join(regions[id_cols])
+
+		# Region ids are only read in as floats because they're missing on the trial measure rows, so make them whole numbers again
+		for col in self.region_cols:
+			if col in wide.columns and pandas.api.types.is_float_dtype(wide[col]) and (wide[col].dropna() % 1 == 0).all():
+				wide[col] = wide[col].astype('Int64')
+
+		wide = pandas.concat([wide, regions.drop(columns = id_cols)], axis = 1)
+		for col, dtype in dtypes.items():
+			if col in wide.columns and str(wide[col].dtype) != str(dtype):
+				wide[col] = wide[col].astype(dtype)
+		return wide
+
+	# Pivot chunks of long results as they're read, holding back the rows for the last trial in each chunk until the next one,
+	# since a trial's rows can be split between two chunks. Each trial's rows have to be together, as they are in results.csv
+	def chunks(self, chunks, dtypes = {}):
+		held = None
+		for chunk in chunks:
+			if not len(chunk):
+				continue
+			if held is not None:
+				chunk = pandas.concat([held, chunk], ignore_index = True)
+			trials = chunk.groupby(self.trial_cols(chunk), sort = False, dropna = False, observed = True).ngroup().to_numpy()
+			last = trials == trials[-1]
+			held = chunk[last]
+			if not last.all():
+				yield self(chunk[~last], dtypes)
+		if held is not None and len(held):
+			yield self(held, dtypes)
+
+# Pivot the rows of long results that have the same values in keys into one row, with a column for each measure (named by headers)
+# Measures with the same name as one of the keys (like trial_total_time) are left out, since they're already a column
+def pivot_rows(rows, keys, measure_col, value_col, headers = {}):
+	groups = rows.groupby(keys, sort = False, dropna = False, observed = True).ngroup().to_numpy()
+	measures, names = pandas.factorize(rows[measure_col].astype(object))
+	cells = groups.astype('int64') * len(names) + measures
+	if len(numpy.unique(cells)) != len(cells):
+		duplicated = rows.loc[pandas.Series(cells).duplicated().to_numpy(), keys + [measure_col]]
+		raise ValueError("more than one value for some measures (" + ", ".join(keys + [measure_col]) + ": " + describe_keys(list(duplicated.itertuples(index = False, name = None))) + ")")
+
+	# Groups are numbered in the order they first appear, so the first row of each one gives its keys in order
+	first = numpy.unique(groups, return_index = True)[1]
+	values = numpy.full((len(first), len(names)), numpy.nan, dtype = object)
+	values[groups, measures] = rows[value_col].to_numpy(dtype = object)
+	measure_cols = pandas.DataFrame(values, columns = [headers.get(str(name), str(name)) for name in names])
+	measure_cols = parse_measures(measure_cols[[col for col in measure_cols.columns if not col in keys]])
+	return pandas.concat([rows[keys].iloc[first].reset_index(drop = True), measure_cols], axis = 1)
+
+# The values of all of the measures are read in together as text, so give each measure's column the type pandas gives it when it reads
+# SideEye's own wide output, by reading it in the same way. Values are then written out as they would be when combining that
+# (e.g. 822.0 in a column that has missing values, and None as missing)
+def parse_measures(measure_cols):
+	if not len(measure_cols.columns):
+		return measure_cols
+	return pandas.read_csv(io.StringIO(measure_cols.to_csv(index = False)), header = 0, names = list(measure_cols.columns))
+
+# Work out the type pandas would give a column read in all at once, from the types it got in each chunk
+def combined_dtype(dtypes):
+	if len(set(str(dtype) for dtype in dtypes)) == 1:
+		return dtypes[0]
+	if set(dtype.kind for dtype in dtypes) <= set('iuf'):
+		return 'float64'
+	return str
+
+# Work out the type pandas would give a pivoted measure column all at once, from the types it got in each chunk
+# A measure that's missing for a whole chunk is float there, and one that's True and False is bool until it's missing somewhere
+def measure_dtype(dtypes):
+	if len(set(str(dtype) for dtype in dtypes)) == 1:
+		return dtypes[0]
+	if set(dtype.kind for dtype in dtypes) <= set('iuf'):
+		return 'float64'
+	return object
+
+# Left join a chunk with a Lookup
+# The joined columns are then given the types they'd have if all of results had been joined at once
+def join_chunk(chunk, lookup, dtypes):
+	chunk = lookup.join(chunk)
+	for col, dtype in dtypes.items():
+		if str(chunk[col].dtype) != str(dtype):
+			chunk[col] = chunk[col].astype(dtype)
+	return chunk
+
+# Combine results.csv with questions (a Lookup) and stimuli (keyed on stimuli_cols) a chunk at a time, writing each chunk out to out_loc as we go
+# so that memory use depends on chunksize rather than the size of results.csv. If pivot (a WidePivot) is given, each chunk is pivoted to wide before it's joined
+# The first pass over results.csv gets the types of its columns and the ids in it, so the stimuli can be checked
+# and every chunk can be read and written out the same way as if results.csv had been read in all at once
+# Returns whether the questions and stimuli were combined, along with the report from validate_stimuli
+def combine_in_chunks(csv_loc, encoding, questions, stimuli, stimuli_cols, out_loc, chunksize, pivot = None):
+	columns = pandas.read_csv(csv_loc, nrows = 0, encoding = encoding).columns.tolist()
+	question_keys = questions.keys if questions is not None else []
+	key_cols = [col for col in columns if col in question_keys or (stimuli is not None and col in stimuli_cols)]
+
+	chunk_dtypes = {col: [] for col in columns}
+	keys = []
+	def first_pass():
+		for chunk in pandas.read_csv(csv_loc, encoding = encoding, chunksize = chunksize):
+			for col in columns:
+				chunk_dtypes[col].append(chunk[col].dtype)
+			keys.append(chunk[key_cols].drop_duplicates())
+			yield chunk
+
+	# Each measure's values are parsed from text in each chunk, so the types they got in each chunk are needed too
+	measure_dtypes = {}
+	if pivot is not None:
+		for wide in pivot.chunks(first_pass()):
+			for col in (col for col in wide.columns if not col in columns):
+				measure_dtypes.setdefault(col, []).append(wide[col].dtype)
+		measure_dtypes = {col: measure_dtype(col_dtypes) for col, col_dtypes in measure_dtypes.items()}
+	else:
+		for _ in first_pass():
+			pass
+
+	dtypes = {col: combined_dtype(chunk_dtypes[col]) for col in columns}
+	keys = pandas.concat(keys).astype({col: dtypes[col] for col in key_cols}).drop_duplicates() if keys else pandas.DataFrame(columns = key_cols)
+
+	stimuli_report = {}
+	if stimuli is not None:
+		stimuli_report = validate_stimuli(stimuli, keys, stimuli_cols)
+		stimuli = Lookup(stimuli, stimuli_cols, 'stimuli') if not stimuli_report else None
+
+	if questions is None and stimuli is None and pivot is None:
+		return False, False, stimuli_report
+
+	# Joining just the distinct keys gives the same types for the joined columns as joining all of results would
+	question_dtypes = {}
+	if questions is not None:
+		joined = questions.join(keys)
+		question_dtypes = {col: joined[col].dtype for col in joined.columns if not col in keys.columns}
+		keys = joined
+
+	stimuli_dtypes = {}
+	if stimuli is not None:
+		joined = stimuli.join(keys)
+		stimuli_dtypes = {col: joined[col].dtype for col in joined.columns if not col in keys.columns}
+		keys = joined
+
+	header = True
+	with open(out_loc, 'w', newline = '') as out:
+		chunks = pandas.read_csv(csv_loc, encoding = encoding, chunksize = chunksize, dtype = dtypes)
+		if pivot is not None:
+			chunks = pivot.chunks(chunks, measure_dtypes)
+		for chunk in chunks:
+			if questions is not None:
+				chunk = join_chunk(chunk, questions, question_dtypes)
+			if stimuli is not None:
+				chunk = join_chunk(chunk, stimuli, stimuli_dtypes)
+			chunk.to_csv(out, index = False, na_rep = 'NA', header = header)
+			header = False
+
+	return questions is not None, stimuli is not None, stimuli_report
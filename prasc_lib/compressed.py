@@ -0,0 +1,82 @@
+##############################################################################################
+################# Reading and writing ASC files kept compressed (.gz/.zst/.xz) ###############
+##############################################################################################
+
+# ASCs compress very well (they're mostly columns of numbers), so they can be kept as e.g. subj1.asc.gz, and read without decompressing them to disk first
+# Question scoring and SideEye read them through open_asc. fix_align (in R) can only read plain files, so they're decompressed into its temp directory
+# gzip and xz are in the standard library. zstd needs the zstandard package, which is only imported if a .zst file is used
+
+import os, re, shutil, tempfile
+from importlib.util import find_spec
+
+from .cache import default_permissions
+
+# The compression extensions that are recognized, and the module that reads and writes each one
+compressions = {'gz': 'gzip', 'zst': 'zstandard', 'xz': 'lzma'}
+
+compression_check = '^$|^gz$|^zst$|^xz$'
+
+# Get the compression of a file from its extension, or None if it isn't compressed
+def compression(loc):
+	extension = os.path.splitext(str(loc))[1][1:].lower()
+	return extension if extension in compressions else None
+
+# Whether a file name is an ASC, compressed or not
+def is_asc(loc):
+	return re.search(r'\.asc(\.gz|\.zst|\.xz)?$', str(loc), flags = re.IGNORECASE) is not None
+
+# Get a file name without its compression extension (e.g. subj1.asc for subj1.asc.gz)
+def uncompressed_name(loc):
+	loc = str(loc)
+	return os.path.splitext(loc)[0] if compression(loc) is not None else loc
+
+# Whether the module for a compression is installed
+def has_compression(kind):
+	return kind is None or find_spec(compressions[kind]) is not None
+
+# Open a file compressed with kind (or not compressed, if kind is None) like open would
+# Compressed files are opened as text unless mode has b in it, the same as plain files (gzip.open and the like default to binary)
+def open_compressed(loc, mode = 'r', kind = None, encoding = None):
+	if kind is None:
+		return open(loc, mode, encoding = encoding)
+
+	if not 'b' in mode and not 't' in mode:
+		mode = mode + 't'
+
+	if kind == 'gz':
+		import gzip
+		return gzip.open(loc, mode, encoding = encoding)
+	elif kind == 'xz':
+		import lzma
+		return lzma.open(loc, mode, encoding = encoding)
+
+	try:
+		import zstandard
+	except ImportError:
+		raise ImportError("zstandard not found, which is needed to read and write .zst files. Have you installed it with 'pip install zstandard'?")
+	return zstandard.open(loc, mode, encoding = encoding)
+
+# Open an ASC, decompressing it as it's read if it's compressed
+def open_asc(loc, mode = 'r', encoding = None):
+	return open_compressed(loc, mode, compression(loc), encoding)
+
+# Decompress an ASC to out_loc (for fix_align, which can only read plain files)
+def decompress_file(loc, out_loc, block_size = 1 << 20):
+	with open_asc(loc, 'rb') as source, open(out_loc, 'wb') as out:
+		shutil.copyfileobj(source, out, block_size)
+
+# Compress the file at source to loc with kind. It's written to a temp file next to loc first, so a partly written file is never left at loc
+def compress_file(source, loc, kind, block_size = 1 << 20):
+	fd, tmp_loc = tempfile.mkstemp(dir = os.path.dirname(os.path.abspath(loc)), prefix = '.tmp_')
+	os.close(fd)
+	try:
+		with open(source, 'rb') as plain, open_compressed(tmp_loc, 'wb', kind) as out:
+			shutil.copyfileobj(plain, out, block_size)
+		default_permissions(tmp_loc)
+		os.replace(tmp_loc, loc)
+	except BaseException:
+		try:
+			os.remove(tmp_loc)
+		except OSError:
+			pass
+		raise
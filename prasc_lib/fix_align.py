@@ -0,0 +1,380 @@
+##############################################################################################
+############### Running fix_align by Andrew Cohen (2013) from prASC.py in shards ##############
+##############################################################################################
+
+import os, re, shutil, atexit, hashlib, threading, subprocess, tempfile
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+from .parallel import make_shards, in_slot
+from .cache import file_hash, params_hash, file_fingerprint, load_manifest, save_manifest
+from .compressed import compressions, compression, uncompressed_name, decompress_file, compress_file
+from .asc_index import index_loc
+
+# The order of the arguments in the fix_align call
+fa_arg_order = ['start_pts', 'asc_files', 'xy_bounds', 'keep_y_var', 'use_run_rule', 'trial_plots', 'save_trial_plots', 'summary_file', 'show_image', 'fa_dir', 'start_flag', 'den_sd_cutoff', 'den_ratio_cutoff', 'k_bounds', 'o_bounds', 's_bounds']
+
+# The manifest in fa_output_dir records what each fix aligned file was made from
+manifest_name = 'prASC_fa_manifest.json'
+
+def strip_quotes(input):
+	return re.sub(r'^\'|^"|\'$|"$', '', str(input))
+
+# Get the name of the fix aligned version of an ASC. Compressed ASCs are fix aligned to plain files, unless fa_compression is set
+def fa_name(file, fa_compression = None):
+	name = re.sub(r'\.asc', '_fa.asc', uncompressed_name(os.path.basename(file)))
+	return name + '.' + fa_compression if fa_compression else name
+
+# Read in the fix_align file and patch it to work better with prASC
+def load_fix_align(fix_align_loc):
+	fix_align = open(fix_align_loc, "r").read()
+	# Fix a problem with directory file name specifications in Windows
+	fix_align = re.sub(r"format\((.*)\)\)", "gsub(':', ';', format(\\1)))", fix_align)
+	# Make the processing messages shorter
+	fix_align = re.sub("print\(paste\('Processing: ', files\[i\], sep=\"\"\)\)", "cat('Processing ', gsub('([A-Z]:\\\\\\\\/|\\\\\\\\/)?(.*\\\\\\\\/)*(.*.asc)', '\\\\\\\\3', files[i]), '...\\n', sep=\"\")", fix_align)
+	return fix_align
+
+# Construct the function call for a list of ASC files. fa_params contains the R code for all other arguments
+def fa_call(asc_files, fa_params, fa_dir):
+	call_args = dict(fa_params)
+	call_args['asc_files'] = ('c("' + '", "'.join(strip_quotes(str(f)) for f in asc_files) + '")').replace(os.sep, '/')
+	call_args['fa_dir'] = '"' + strip_quotes(str(fa_dir)).replace(os.sep, '/') + '"'
+	call_args['start_flag'] = '"' + strip_quotes(call_args['start_flag']) + '"'
+	return "\n\nfix_align(" + ", ".join(arg + " = " + str(call_args[arg]) for arg in fa_arg_order) + ")"
+
+# A persistent R worker loads fix_align once, then runs jobs sent to it over stdin until stdin is closed
+# Each job is the location of a script with a fix_align call. When a job finishes, the worker writes worker_marker and OK, or ERROR and the error message, on their own line
+worker_marker = 'prASC_JOB_DONE'
+worker_loop = '''
+
+jobs <- file("stdin", open = "r")
+while (length(job <- readLines(jobs, n = 1)) > 0) {
+	status <- tryCatch({
+		source(job, local = new.env())
+		"OK"
+	}, error = function(e) paste("ERROR", gsub("[\\r\\n]+", " ", conditionMessage(e))))
+	cat("\\n''' + worker_marker + ''' ", status, "\\n", sep = "")
+	flush(stdout())
+}
+'''
+
+# An R process with fix_align loaded, which can be sent jobs one at a time
+class RWorker:
+	def __init__(self, fix_align, rscript = 'Rscript'):
+		self.worker_dir = tempfile.mkdtemp(prefix = 'prASC_rworker_')
+		script_loc = Path(self.worker_dir) / 'fix_align_worker.r'
+		with open(script_loc, 'w') as script:
+			script.write(fix_align + worker_loop)
+
+		self.process = subprocess.Popen([rscript, '--vanilla', str(script_loc)], stdin = subprocess.PIPE, stdout = subprocess.PIPE, universal_newlines = True, bufsize = 1)
+
+	def alive(self):
+		return self.process.poll() is None
+
+	# Run fix_align on files, writing the output to fa_dir. fix_align's messages are passed through to the console
+	# Returns None if the job ran, or the error message if fix_align failed. Raises EOFError if the worker stopped
+	def run(self, files, fa_params, fa_dir):
+		job_loc = Path(fa_dir).parent / 'fix_align_job.r'
+		with open(job_loc, 'w') as job:
+			job.write(fa_call(files, fa_params, fa_dir))
+
+		self.process.stdin.write(str(job_loc).replace(os.sep, '/') + '\n')
+		self.process.stdin.flush()
+		for line in self.process.stdout:
+			if line.startswith(worker_marker):
+				status = line[len(worker_marker):].strip()
+				return None if status == 'OK' else re.sub('^ERROR ?', '', status) or "fix_align failed"
+			elif line.strip():
+				print(line, end = '')
+
+		raise EOFError("exited with status " + str(self.process.wait()))
+
+	def close(self):
+		try:
+			self.process.stdin.close()
+			self.process.wait(timeout = 10)
+		except Exception:
+			self.process.kill()
+		shutil.rmtree(self.worker_dir, ignore_errors = True)
+
+# Keeps idle R workers for a fix_align file so they can be reused, and starts new ones when they're all busy
+class WorkerPool:
+	def __init__(self, fix_align, rscript = 'Rscript'):
+		self.fix_align = fix_align
+		self.rscript = rscript
+		self.idle = []
+		self.lock = threading.Lock()
+
+	def acquire(self):
+		with self.lock:
+			while self.idle:
+				worker = self.idle.pop()
+				if worker.alive():
+					return worker
+				worker.close()
+		return RWorker(self.fix_align, self.rscript)
+
+	def release(self, worker):
+		with self.lock:
+			self.idle.append(worker)
+
+	def close(self):
+		with self.lock:
+			for worker in self.idle:
+				worker.close()
+			self.idle = []
+
+# Worker pools are kept for as long as prASC is running, so later batches of files don't have to start R again
+# There's one for each fix_align file (and Rscript), since experiments run at once can use different ones
+worker_pools = {}
+worker_pools_lock = threading.Lock()
+
+def get_worker_pool(fix_align, rscript = 'Rscript'):
+	key = (hashlib.sha256(fix_align.encode('utf-8')).hexdigest(), rscript)
+	with worker_pools_lock:
+		if not key in worker_pools:
+			worker_pools[key] = WorkerPool(fix_align, rscript)
+		return worker_pools[key]
+
+@atexit.register
+def close_worker_pools():
+	for pool in worker_pools.values():
+		pool.close()
+
+# Run fix_align on files in a worker from workers
+# Returns whether the job ran, and the error message if fix_align failed
+# If a worker can't be started or stops partway through, the job didn't run, so it can be run with Rscript instead
+def run_in_worker(workers, files, fa_params, fa_dir):
+	try:
+		worker = workers.acquire()
+	except OSError as e:
+		print("Warning: unable to start R worker (" + str(e) + "). Running fix_align with Rscript...")
+		return False, None
+
+	try:
+		error = worker.run(files, fa_params, fa_dir)
+	except (OSError, EOFError) as e:
+		worker.close()
+		print("Warning: R worker stopped unexpectedly (" + str(e) + "). Running fix_align with Rscript...")
+		return False, None
+
+	workers.release(worker)
+	return True, error
+
+# Run fix_align on one shard in its own temp directory inside fa_output_dir, with its own temp script
+# If workers is a WorkerPool, the shard is run in one of its R workers, falling back to a new Rscript process if that doesn't work
+# Returns the contents of the summary files it wrote and a dict of failed files and their error messages
+# If a shard with more than one file fails, each of its files is rerun on its own to find the one(s) that failed
+def run_shard(files, fix_align, fa_params, fa_output_dir, rscript = 'Rscript', workers = None, fa_compression = None):
+	with tempfile.TemporaryDirectory(prefix = 'prASC_fa_', dir = fa_output_dir) as temp_dir:
+		shard_dir = Path(temp_dir) / 'out'
+		os.makedirs(shard_dir)
+
+		# fix_align can only read plain files, so compressed ASCs are decompressed into the temp directory (and deleted along with it)
+		# A file that can't be decompressed fails like one fix_align couldn't align, without running fix_align
+		ran, error = False, None
+		try:
+			inputs = decompressed_inputs(files, Path(temp_dir) / 'in')
+		except Exception as e:
+			ran, error = True, "unable to decompress (" + type(e).__name__ + ": " + str(e) + ")"
+
+		if not ran and workers is not None:
+			ran, error = run_in_worker(workers, inputs, fa_params, shard_dir)
+		if not ran:
+			script_loc = Path(temp_dir) / 'fix_align_tmp.r'
+			with open(script_loc, 'w') as script:
+				script.write(fix_align + fa_call(inputs, fa_params, shard_dir))
+
+			result = subprocess.run([rscript, '--vanilla', str(script_loc)], stderr = subprocess.PIPE, universal_newlines = True)
+			if result.returncode != 0:
+				error = [line for line in result.stderr.splitlines() if line.strip()]
+				error = error[-1] if error else "Rscript exited with status " + str(result.returncode)
+
+		if error is not None:
+			if len(files) > 1:
+				summaries = []
+				failures = {}
+				for file in files:
+					file_summaries, file_failures = run_shard([file], fix_align, fa_params, fa_output_dir, rscript, workers, fa_compression)
+					summaries.extend(file_summaries)
+					failures.update(file_failures)
+				return summaries, failures
+
+			return [], {files[0]: error}
+
+		# Move the fix aligned files (and any plots) into the output directory, and keep the summaries to merge
+		# Fix aligned files are compressed on the way if fa_compression is set
+		summaries = []
+		for f in sorted(os.listdir(shard_dir)):
+			if f.endswith('.fas'):
+				summaries.append((f, open(shard_dir / f, 'r').read()))
+			elif '_fa.asc' in f:
+				move_fa_file(shard_dir / f, fa_output_dir, fa_compression)
+			else:
+				os.replace(shard_dir / f, Path(fa_output_dir) / f)
+
+		return summaries, {}
+
+# Get the files to give fix_align for files, decompressing any compressed ones into temp_dir
+def decompressed_inputs(files, temp_dir):
+	inputs = []
+	for file in files:
+		if compression(file) is None:
+			inputs.append(file)
+			continue
+
+		if not os.path.exists(temp_dir):
+			os.makedirs(temp_dir)
+		loc = Path(temp_dir) / uncompressed_name(os.path.basename(file))
+		decompress_file(file, loc)
+		inputs.append(str(loc))
+	return inputs
+
+# Move a fix aligned file into fa_output_dir, compressed with fa_compression if it's set
+# Any other version of it (compressed differently, or not at all) is removed along with its trial index, so the same file isn't analyzed twice
+def move_fa_file(loc, fa_output_dir, fa_compression = None):
+	name = os.path.basename(loc)
+	out_name = name + '.' + fa_compression if fa_compression else name
+	for other in [name] + [name + '.' + kind for kind in compressions]:
+		if other != out_name and os.path.isfile(Path(fa_output_dir) / other):
+			os.remove(Path(fa_output_dir) / other)
+			if os.path.isfile(index_loc(Path(fa_output_dir) / other)):
+				os.remove(index_loc(Path(fa_output_dir) / other))
+
+	if fa_compression:
+		compress_file(loc, Path(fa_output_dir) / out_name, fa_compression)
+	else:
+		os.replace(loc, Path(fa_output_dir) / out_name)
+
+# Remove the fix aligned versions of an ASC (compressed or not) and their trial indexes, e.g. older ones for an ASC fix_align failed for
+# Returns the names of the files that were removed
+def remove_fa_files(file, fa_output_dir):
+	name = fa_name(file)
+	removed = []
+	for other in [name] + [name + '.' + kind for kind in compressions]:
+		if os.path.isfile(Path(fa_output_dir) / other):
+			os.remove(Path(fa_output_dir) / other)
+			removed.append(other)
+		if os.path.isfile(index_loc(Path(fa_output_dir) / other)):
+			os.remove(index_loc(Path(fa_output_dir) / other))
+	return removed
+
+# Merge the summary files from each shard into one file, keeping only the first header
+def merge_summaries(summaries, fa_output_dir):
+	if not summaries:
+		return None
+
+	merged_loc = Path(fa_output_dir) / summaries[0][0]
+	header = None
+	with open(merged_loc, 'w') as merged:
+		for name, text in summaries:
+			lines = text.splitlines(True)
+			if lines and header is None:
+				header = lines[0]
+			elif lines and lines[0] == header:
+				lines = lines[1:]
+			merged.writelines(lines)
+			if lines and not lines[-1].endswith('\n'):
+				merged.write('\n')
+
+	return merged_loc
+
+# Fix align a list of ASC files with up to jobs Rscript processes running at once
+# If persistent is set, the shards are run in R workers that stay open for later calls. If fa_compression is set, the fix aligned files are compressed with it
+# Returns a dict of the files that failed and their error messages
+def run_fix_align(files, fix_align_loc, fa_params, fa_output_dir, jobs = 1, rscript = 'Rscript', persistent = False, fa_compression = None):
+	fix_align = load_fix_align(fix_align_loc)
+	shards = make_shards(files, jobs)
+	workers = get_worker_pool(fix_align, rscript) if persistent else None
+
+	summaries = []
+	failures = {}
+	# Each shard is a separate Rscript process, so threads are all we need to run them at once
+	# When several experiments are run at once, the shards wait for a free slot, so no more than jobs R processes run in total
+	with ThreadPoolExecutor(max_workers = len(shards)) as executor:
+		results = [executor.submit(in_slot, run_shard, shard, fix_align, fa_params, fa_output_dir, rscript, workers, fa_compression) for shard in shards]
+		for result in results:
+			shard_summaries, shard_failures = result.result()
+			summaries.extend(shard_summaries)
+			failures.update(shard_failures)
+
+	merge_summaries(summaries, fa_output_dir)
+
+	return failures
+
+# fix_align settings that only change the plots and summary file it makes, not the fix aligned ASCs, so changing them doesn't realign anything
+output_only_settings = ['show_image', 'trial_plots', 'save_trial_plots', 'summary_file']
+
+# Hash everything that affects the fix aligned ASCs other than the ASC itself: the parameters, and the fix_align file
+def fa_params_hash(fa_params, fix_align_loc):
+	fa_params = {name: value for name, value in fa_params.items() if not name in output_only_settings}
+	return params_hash(dict(fa_params, fix_align = file_hash(fix_align_loc)))
+
+# Work out which ASC files need to be fix aligned, using the manifest in fa_output_dir
+# A file is realigned if it has no fix aligned version, or if it or the fix_align parameters changed since it was aligned
+# Fix aligned files from before there was a manifest are assumed to be up to date, and are added to it
+# Files are also realigned if their fix aligned version isn't compressed with fa_compression
+# Returns the files to align, along with the manifest entries to record for them once they have been aligned
+def files_to_align(asc_files, fa_output_dir, fa_params_fingerprint, refix = False, fa_compression = None):
+	manifest_loc = Path(fa_output_dir) / manifest_name
+	manifest = load_manifest(manifest_loc)
+	existing = set(os.listdir(fa_output_dir))
+
+	to_align = []
+	entries = {}
+	for file in asc_files:
+		name = os.path.basename(file)
+		entry = manifest.get(name)
+		fingerprint = file_fingerprint(file, entry)
+		fingerprint['params'] = fa_params_fingerprint
+
+		if refix or not fa_name(file, fa_compression) in existing:
+			to_align.append(file)
+		elif entry is None:
+			manifest[name] = fingerprint
+		elif entry.get('hash') != fingerprint['hash'] or entry.get('params') != fa_params_fingerprint:
+			to_align.append(file)
+		elif entry != fingerprint:
+			# The file was touched but its contents are the same
+			manifest[name] = fingerprint
+
+		entries[name] = fingerprint
+
+	save_manifest(manifest, manifest_loc)
+
+	return to_align, {name: entries[name] for name in (os.path.basename(file) for file in to_align)}
+
+# Like files_to_align, but nothing is read or written, for showing what a run would do
+# Files whose size or modification time changed are listed without rehashing them, so some may turn out to be unchanged
+def planned_alignments(asc_files, fa_output_dir, fa_params_fingerprint, refix = False, fa_compression = None):
+	manifest = load_manifest(Path(fa_output_dir) / manifest_name)
+	existing = set(os.listdir(fa_output_dir)) if os.path.isdir(fa_output_dir) else set()
+
+	to_align = []
+	for file in asc_files:
+		entry = manifest.get(os.path.basename(file))
+		if refix or not fa_name(file, fa_compression) in existing:
+			to_align.append(file)
+		elif entry is None:
+			continue
+		elif entry.get('params') != fa_params_fingerprint or entry.get('hash') is None:
+			to_align.append(file)
+		else:
+			stat = os.stat(file)
+			if entry.get('size') != stat.st_size or entry.get('mtime') != stat.st_mtime_ns:
+				to_align.append(file)
+
+	return to_align
+
+# Record the files that were fix aligned successfully in the manifest
+# Files that failed are marked so that they are tried again next time, even if an older fix aligned version exists
+def update_manifest(fa_output_dir, entries, failures = {}):
+	manifest_loc = Path(fa_output_dir) / manifest_name
+	manifest = load_manifest(manifest_loc)
+	failed = set(os.path.basename(file) for file in failures)
+	for name, entry in entries.items():
+		if name in failed:
+			manifest[name] = {'hash': None}
+		else:
+			manifest[name] = entry
+	save_manifest(manifest, manifest_loc)
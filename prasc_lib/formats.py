@@ -0,0 +1,65 @@
+##############################################################################################
+##################### Reading and writing prASC output in different formats ###################
+##############################################################################################
+
+import io, os, json, locale
+from importlib.util import find_spec
+
+from .instrument import timed_import
+
+# The extension used for each output in each format. The question files have always been space separated .txt files
+extensions = {
+	'csv': {'results': '.csv', 'questions': '.txt'},
+	'parquet': {'results': '.parquet', 'questions': '.parquet'},
+	'feather': {'results': '.feather', 'questions': '.feather'},
+}
+
+# Get the name of an output file in a format
+def output_name(name, output_format, kind = 'results'):
+	return name + extensions[output_format][kind]
+
+# Parquet and feather files are written with pyarrow, which isn't needed for csv output
+# This only looks for it, so checking doesn't pay for importing it
+def has_pyarrow():
+	return find_spec('pyarrow') is not None
+
+# Read a table written in a format. The keyword arguments are passed to pandas.read_csv, and are ignored for the other formats,
+# since they store their own column types and don't need an encoding or separator
+def read_table(loc, output_format, **csv_args):
+	pandas = timed_import('pandas')
+	if output_format == 'parquet':
+		return pandas.read_parquet(loc)
+	if output_format == 'feather':
+		return pandas.read_feather(loc)
+	return pandas.read_csv(loc, **csv_args)
+
+# Write a table in a format. Missing values are written as NA in csv files so R reads them as missing
+def write_table(table, loc, output_format):
+	if output_format == 'parquet':
+		table.to_parquet(loc, index = False)
+	elif output_format == 'feather':
+		table.reset_index(drop = True).to_feather(loc)
+	else:
+		table.to_csv(loc, index = False, na_rep = 'NA')
+
+# Write out the question files from their lines of text
+# For columnar formats, the text is parsed the same way the combine step reads the .txt files, so the columns get the same types either way
+def write_question_table(lines, loc, output_format):
+	if output_format == 'csv':
+		with open(loc, 'w') as file:
+			file.writelines(lines)
+	else:
+		pandas = timed_import('pandas')
+		write_table(pandas.read_csv(io.StringIO(''.join(lines)), sep = " "), loc, output_format)
+
+# Convert the results.csv written by SideEye to a columnar format, using the compact types from load_results, and remove the csv
+# SideEye (and merge_results) write results.csv with the default encoding, so that's what it's read back in with
+def convert_results(csv_loc, loc, output_format, config_json_loc):
+	from .combine import load_results
+
+	with open(config_json_loc, 'r') as file:
+		config = json.load(file)
+
+	outputs = [config.get('trial_output', {}), config.get('region_output', {})]
+	write_table(load_results(csv_loc, locale.getpreferredencoding(False), *outputs), loc, output_format)
+	os.remove(csv_loc)
@@ -0,0 +1,177 @@
+##############################################################################################
+############################# Measuring resource use in prASC.py #############################
+##############################################################################################
+
+import os, sys, json, time, platform, importlib, threading
+from datetime import datetime
+
+from .cache import atomic_open
+
+# Get the peak resident memory of this process so far (its high-water mark since it started) in MB, or None if it can't be measured on this platform
+# If children is set, get the largest peak of any child process that has finished (worker processes, Rscript) instead
+def peak_rss_mb(children = False):
+	try:
+		import resource
+	except ImportError:
+		return None
+
+	peak = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF).ru_maxrss
+	# Linux reports this in KB, macOS in bytes
+	if sys.platform == 'darwin':
+		return peak / (1024 * 1024)
+	return peak / 1024
+
+# Get the resident memory this process is using right now in MB, or None if it can't be measured on this platform (only Linux has /proc)
+def current_rss_mb():
+	try:
+		with open('/proc/self/statm', 'r') as statm:
+			return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+	except (OSError, ValueError, AttributeError):
+		return None
+
+# Samples this process's resident memory every interval seconds in a background thread, to find its peak while something runs
+# Unlike peak_rss_mb, this only covers the time between start and stop, so a stage or file isn't given the peak of an earlier one
+# stop returns the peak in MB, or None if memory can't be measured on this platform. Memory used between samples can be missed
+class RssSampler:
+	def __init__(self, interval = 0.01):
+		self.interval = interval
+		self.peak = None
+		self.stopped = threading.Event()
+		self.thread = None
+
+	def sample(self):
+		rss = current_rss_mb()
+		if rss is not None and (self.peak is None or rss > self.peak):
+			self.peak = rss
+
+	def run(self):
+		while not self.stopped.wait(self.interval):
+			self.sample()
+
+	def start(self):
+		self.sample()
+		if self.peak is not None:
+			self.thread = threading.Thread(target = self.run, daemon = True)
+			self.thread.start()
+		return self
+
+	def stop(self):
+		self.stopped.set()
+		if self.thread is not None:
+			self.thread.join()
+			self.sample()
+		return round(self.peak, 2) if self.peak is not None else None
+
+# Get the CPU time used by this process and by child processes that have finished
+def cpu_seconds():
+	times = os.times()
+	return times.user + times.system + times.children_user + times.children_system
+
+def file_size(loc):
+	try:
+		return os.path.getsize(loc)
+	except OSError:
+		return 0
+
+# How long each heavy module took to import, in seconds, for the ones that have been imported with timed_import
+import_times = {}
+
+# Import a module the first time a stage needs it (so runs that don't need it don't pay for importing it), and record how long it took
+# Raises ImportError like import does if it isn't installed
+# This always goes through import_module, since a module another thread is still importing is already in sys.modules, half set up
+def timed_import(name):
+	imported = name in sys.modules
+	start = time.perf_counter()
+	module = importlib.import_module(name)
+	if not imported:
+		import_times[name] = round(time.perf_counter() - start, 4)
+	return module
+
+# Call func(item, *args) and time it, so the time for each file can be measured in worker processes
+# Returns the result along with the wall and CPU time it took, and the peak memory of the process that ran it while it ran
+def timed_call(item, func, *args):
+	sampler = RssSampler().start()
+	wall = time.perf_counter()
+	cpu = time.process_time()
+	result = func(item, *args)
+	return result, {'wall_seconds': round(time.perf_counter() - wall, 4), 'cpu_seconds': round(time.process_time() - cpu, 4), 'peak_rss_mb': sampler.stop()}
+
+# Records the wall time, CPU time, peak memory use, and size of the input files for each stage of a run, and for each file in a stage
+# input_bytes is the size of each input file, not how much of it was read (cached and indexed files are mostly not read at all)
+# A stage's peak_rss_mb is the peak of this process while the stage ran. peak_rss_mb_so_far and peak_child_rss_mb_so_far are the
+# high-water marks since the run started, which is all some platforms can measure. Peaks for worker processes are kept for each file
+# If profile is set, stages started with profile = True are also run under cProfile
+class RunReport:
+	def __init__(self, arguments = None, profile = False):
+		self.profile = profile
+		self.profiles = {}
+		self.stages = []
+		self.started = datetime.now()
+		self.start_wall = time.perf_counter()
+		self.start_cpu = cpu_seconds()
+		self.arguments = arguments
+
+	# Start timing a stage that reads files. Returns the record for the stage, which is passed to add_file and finish
+	def start(self, name, files = (), profile = False):
+		stage = {'name': name, 'files': len(files), 'input_bytes': 0, 'per_file': {}}
+		for file in files:
+			size = file_size(file)
+			stage['input_bytes'] += size
+			stage['per_file'][str(file)] = {'input_bytes': size}
+
+		if profile and self.profile:
+			import cProfile
+			self.profiles[name] = cProfile.Profile()
+
+		stage['_rss'] = RssSampler().start()
+		stage['_wall'] = time.perf_counter()
+		stage['_cpu'] = cpu_seconds()
+		if name in self.profiles:
+			self.profiles[name].enable()
+		return stage
+
+	# Record measurements for a single file in a stage
+	def add_file(self, stage, file, **measurements):
+		stage['per_file'].setdefault(str(file), {}).update(measurements)
+
+	def finish(self, stage, **measurements):
+		if stage['name'] in self.profiles:
+			self.profiles[stage['name']].disable()
+
+		stage['wall_seconds'] = round(time.perf_counter() - stage.pop('_wall'), 4)
+		stage['cpu_seconds'] = round(cpu_seconds() - stage.pop('_cpu'), 4)
+		stage['peak_rss_mb'] = stage.pop('_rss').stop()
+		stage['peak_rss_mb_so_far'] = peak_rss_mb()
+		stage['peak_child_rss_mb_so_far'] = peak_rss_mb(children = True)
+		stage.update(measurements)
+		self.stages.append(stage)
+
+	# Write out the report to report_dir as JSON, along with the profile for each profiled stage, which can be read with pstats or snakeviz
+	# Returns the location of the report
+	def write(self, report_dir):
+		# Measure everything before platform.platform(), which can start a process of its own
+		report = {
+			'started': self.started.isoformat(timespec = 'seconds'),
+			'arguments': self.arguments,
+			'wall_seconds': round(time.perf_counter() - self.start_wall, 4),
+			'cpu_seconds': round(cpu_seconds() - self.start_cpu, 4),
+			'peak_rss_mb': peak_rss_mb(),
+			'peak_child_rss_mb': peak_rss_mb(children = True),
+			'import_seconds': dict(import_times),
+			'stages': self.stages,
+		}
+		report['python'] = platform.python_version()
+		report['platform'] = platform.platform()
+
+		for name, profiler in self.profiles.items():
+			profile_loc = os.path.join(report_dir, 'prASC_profile_' + name + '.prof')
+			profiler.dump_stats(profile_loc)
+			for stage in self.stages:
+				if stage['name'] == name:
+					stage['profile'] = profile_loc
+
+		report_loc = os.path.join(report_dir, 'prASC_run_report.json')
+		with atomic_open(report_loc) as file:
+			json.dump(report, file, indent = 1, default = str)
+
+		return report_loc
@@ -0,0 +1,103 @@
+##############################################################################################
+########################## Worker pool helpers for prASC.py stages ###########################
+##############################################################################################
+
+import os, threading
+from contextlib import contextmanager
+
+# Fork worker processes where possible, since they start quickly and share the modules already imported
+# Otherwise (on Windows), spawn them. The work they do is in prasc_lib, and prASC.py only runs when it's the main script, so spawned workers don't run it again
+def start_method():
+	import multiprocessing
+	return 'fork' if 'fork' in multiprocessing.get_all_start_methods() else 'spawn'
+
+# Work out how many worker processes to use. 0 or less means one per core
+def resolve_jobs(jobs):
+	if jobs is None:
+		return 1
+	if jobs < 1:
+		return os.cpu_count() or 1
+	return jobs
+
+# Split items into at most n_shards contiguous shards of about the same size
+def make_shards(items, n_shards):
+	items = list(items)
+	n_shards = max(1, min(n_shards, len(items)))
+	size, extra = divmod(len(items), n_shards)
+	shards = []
+	start = 0
+	for i in range(n_shards):
+		end = start + size + (1 if i < extra else 0)
+		shards.append(items[start:end])
+		start = end
+	return shards
+
+# multiprocessing and concurrent.futures are only imported when there's a pool to make, so runs with one job start quicker
+def process_pool(jobs):
+	import multiprocessing
+	from concurrent.futures import ProcessPoolExecutor
+	return ProcessPoolExecutor(max_workers = jobs, mp_context = multiprocessing.get_context(start_method()))
+
+# When several experiments are run at once, they share one pool of worker processes, and a limit on the number of R processes
+# so there are never more than --jobs of each running. These are set by shared_pool
+shared_executor = None
+shared_slots = None
+
+# Share a pool of jobs worker processes between every stage run in this block, instead of making one for each stage
+# The workers are all started before the block, since forking after experiments have started running in threads isn't safe
+@contextmanager
+def shared_pool(jobs):
+	global shared_executor, shared_slots
+	executor = process_pool(jobs) if jobs > 1 else None
+	if executor is not None:
+		executor.submit(int).result()
+	shared_executor = executor
+	shared_slots = threading.BoundedSemaphore(jobs)
+	try:
+		yield executor
+	finally:
+		shared_executor = None
+		shared_slots = None
+		if executor is not None:
+			executor.shutdown()
+
+# Run func(*args), waiting for a free slot first if a shared pool is in use (for work done outside of the pool, like Rscript processes)
+def in_slot(func, *args):
+	slots = shared_slots
+	if slots is None:
+		return func(*args)
+	with slots:
+		return func(*args)
+
+# Run func(*args) in the shared pool if one is in use, or in this thread if not. Returns a future for its result either way
+def submit(func, *args):
+	if shared_executor is not None:
+		return shared_executor.submit(func, *args)
+
+	from concurrent.futures import Future
+	future = Future()
+	try:
+		future.set_result(func(*args))
+	except Exception as e:
+		future.set_exception(e)
+	return future
+
+# Run func over items in a pool of worker processes, yielding the results in the same order as items
+# If a shared pool is in use, it's used instead of making a new one
+def ordered_map(func, items, args = (), jobs = 1):
+	items = list(items)
+	if shared_executor is not None and len(items) > 1:
+		futures = [shared_executor.submit(func, item, *args) for item in items]
+		for future in futures:
+			yield future.result()
+		return
+
+	if jobs <= 1 or len(items) <= 1:
+		for item in items:
+			yield func(item, *args)
+		return
+
+	with process_pool(min(jobs, len(items))) as executor:
+		futures = [executor.submit(func, item, *args) for item in items]
+		for future in futures:
+			yield future.result()
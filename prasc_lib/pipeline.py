@@ -0,0 +1,1030 @@
+##############################################################################################
+############### The stages of prASC.py as functions that can be called directly ##############
+##############################################################################################
+
+# prASC.py is a thin command line wrapper around these. To run an experiment from Python:
+#
+#	from prasc_lib.pipeline import Options, run_experiment
+#	run_experiment('parameters.py', Options(overwrite = True, jobs = 4))
+#
+# pandas and SideEye are only imported by the stages that use them, so runs that only fix align or score questions start quickly
+# Once imported they stay imported, so running many experiments in one process only pays for importing them once
+
+import os, re, json, time
+from pathlib import Path
+from importlib.util import find_spec
+
+from . import parallel, formats
+from .fix_align import strip_quotes, fa_name
+from .compressed import compression, compression_check, has_compression, uncompressed_name
+from .instrument import RunReport, timed_call, timed_import
+
+# The directory prASC.py is in, which is where parameters files, config.json, etc. are looked for by default
+default_dir = Path(__file__).resolve().parents[1]
+
+# Raised where prASC.py would print an error and exit
+class PipelineError(Exception):
+	pass
+
+# Raised when a package that's needed isn't installed
+class MissingDependency(PipelineError):
+	pass
+
+# Raised by an ask function that can't ask, so the setting is left as it is and checking moves on to the next one
+class NoAnswer(Exception):
+	pass
+
+# An ask function for batch mode (on cluster nodes, etc.), where nobody is there to answer
+# Instead of prompting, it records what was wrong, so every problem with the parameters can be reported at once
+class BatchAsk:
+	def __init__(self):
+		self.errors = []
+
+	def __call__(self, prompt):
+		self.fail(prompt)
+		raise NoAnswer(prompt)
+
+	# Record an error. The part of a prompt asking for a new value is left off, since they're listed under one error message
+	def fail(self, message):
+		message = re.sub(r'^Error:\s*', '', message.strip())
+		self.errors.append(re.sub(r'\s*(Please (enter|specify)|What is your|Exiting\.).*$', '', message))
+
+	# Raise a PipelineError listing all of the errors, if there were any
+	def check(self, parameters_loc):
+		if self.errors:
+			raise PipelineError("Error: found " + str(len(self.errors)) + " problem(s) with the parameters in " + str(parameters_loc) + ":\n" + "\n".join("  " + error for error in self.errors) + "\nExiting...")
+
+# The options from the command line, which say which stages to run and how
+class Options:
+	def __init__(self, overwrite = False, keepall = False, refix = False, nofix = False, nosentences = False, verbose = False,
+		noquestions = False, nocombine = False, nocache = False, jobs = 1, rworker = False, output_format = 'csv', profile = False, chunksize = 0, dry_run = False,
+		batch = False, stream = False, watch = False):
+		self.overwrite = overwrite
+		self.keepall = keepall
+		self.refix = refix
+		self.nofix = nofix
+		self.nosentences = nosentences
+		self.verbose = verbose
+		self.noquestions = noquestions
+		self.nocombine = nocombine
+		self.nocache = nocache
+		self.jobs = jobs
+		self.rworker = rworker
+		self.output_format = output_format
+		self.profile = profile
+		self.chunksize = chunksize
+		self.dry_run = dry_run
+		self.batch = batch
+		self.stream = stream
+		self.watch = watch
+
+	# Make options from parsed command line arguments, ignoring any that aren't options (like the parameters file)
+	@classmethod
+	def from_args(cls, args):
+		names = cls().__dict__
+		return cls(**{name: value for name, value in vars(args).items() if name in names})
+
+	def as_dict(self):
+		return dict(self.__dict__)
+
+	def nothing_to_do(self):
+		return self.nofix and self.nosentences and self.noquestions and self.nocombine
+
+	# Deal with some combinations of options, printing a warning when one is overridden
+	def resolve(self):
+		if self.refix and self.nofix:
+			print("Warning: refix and nofix cannot both be set. nofix will be respected.")
+			self.refix = False
+
+		if self.nocombine:
+			self.keepall = True
+
+		if not self.nocombine and self.nofix:
+			print("Warning: combining results without fix aligning ASCs. If your ASCs have not been previously corrected, this can lead to errors due to missing data.")
+
+		self.jobs = parallel.resolve_jobs(self.jobs)
+
+		if self.profile and self.jobs > 1:
+			print("Warning: only the main process is profiled, so work done by worker processes won't show up in profiles. Use '--jobs 1' ('-j 1') to profile it.")
+
+		if self.output_format != 'csv' and self.chunksize > 0:
+			print("Warning: chunksize is only used when combining csv files. Combining " + self.output_format + " files in memory.")
+			self.chunksize = 0
+
+		return self
+
+# Check that the packages needed for the stages being run are installed, without importing them until they're used
+def check_dependencies(options):
+	# We need pandas if we're doing these things, but not otherwise
+	if not options.nocombine or options.output_format != 'csv':
+		if find_spec('pandas') is None:
+			raise MissingDependency("Error: pandas not found. Have you installed it with 'pip install pandas'? Exiting...")
+
+	if not options.nosentences and find_spec('sideeye') is None:
+		raise MissingDependency("Error: sideeye not found. Have you installed it with 'pip install sideeye'? Exiting...")
+
+	if options.output_format != 'csv' and not formats.has_pyarrow():
+		raise MissingDependency("Error: pyarrow not found, which is needed to write " + options.output_format + " files. Have you installed it with 'pip install pyarrow'? Exiting...")
+
+# The settings for an experiment, with defaults filled in and checked, and the locations of the files prASC writes
+class Parameters:
+	def __init__(self, asc_files_dir = None, fa_output_dir = None, script_loc = None, fix_align_loc = None, config_json_loc = None,
+		sentences_txt_loc = None, stimuli_loc = None, file_encoding = 'latin1', output_dir = None, cache_dir = None, fa_settings = None, fa_compression = None):
+		self.asc_files_dir = asc_files_dir
+		self.fa_output_dir = fa_output_dir
+		self.script_loc = script_loc
+		self.fix_align_loc = fix_align_loc
+		self.config_json_loc = config_json_loc
+		self.sentences_txt_loc = sentences_txt_loc
+		self.stimuli_loc = stimuli_loc
+		self.file_encoding = file_encoding
+		self.output_dir = output_dir
+		self.cache_dir = cache_dir
+		# The arguments to the fix_align call (other than the files and output directory), as R code
+		self.fa_settings = fa_settings if fa_settings is not None else {}
+		# The compression to write fix aligned files with (gz, zst, or xz), or None to write them uncompressed
+		self.fa_compression = fa_compression
+
+	# Set the locations of the output files in the output format
+	def set_output_locations(self, output_format):
+		if self.output_dir is None:
+			return
+		output_dir = Path(self.output_dir)
+		# SideEye always writes out results.csv, which is converted to the output format afterward if needed
+		self.csv_loc = output_dir / "results.csv"
+		self.results_loc = output_dir / formats.output_name("results", output_format)
+		self.subj_quest_file_name = output_dir / formats.output_name('subject_question_info', output_format, 'questions')
+		self.summary_file_name = output_dir / formats.output_name('question_summary', output_format, 'questions')
+		self.combined_loc = output_dir / formats.output_name('results_combined', output_format)
+
+# Read in a parameters file, which is Python code that sets variables
+# Returns the variables it sets. If it can't be read, ask for another location until one can be
+def read_parameters_file(parameters_loc, ask = input):
+	while True:
+		try:
+			if not re.match('.*\.py$', str(parameters_loc)):
+				parameters_loc = Path(str(parameters_loc) + '.py')
+			with open(parameters_loc, 'r') as parameters:
+				whole_file = parameters.read()
+			values = {}
+			exec(whole_file, values)
+			return {name: value for name, value in values.items() if not name.startswith('__')}
+		except OSError:
+			parameters_loc = Path(ask("Error: no parameters file found at " + str(parameters_loc) + ". Please specify a parameters file location: "))
+		except Exception as e:
+			parameters_loc = Path(ask("Error: unable to read parameters file " + str(parameters_loc) + " (" + type(e).__name__ + ": " + str(e) + "). Please specify a parameters file location: "))
+
+# Add an extension to a location if it doesn't have it already
+def with_extension(loc, extension):
+	if not str(loc).lower().endswith(extension):
+		return Path(str(loc) + extension)
+	return Path(loc)
+
+# Get the location of a file from values, or default if it isn't set, adding the extension if needed
+# If the file doesn't exist, ask for a location until we get one that does
+def resolve_file(values, name, default, extension, prompt, ask = input):
+	loc = with_extension(values.get(name, default), extension)
+	while not os.path.isfile(loc):
+		try:
+			loc = ask(prompt)
+		except NoAnswer:
+			break
+		loc = with_extension(loc, extension) if loc else Path(default)
+	return Path(loc)
+
+# Get a fix_align setting from values, or default if it isn't set. If it doesn't match check, ask for one that does
+def resolve_setting(values, name, default, check, prompt, ask = input, upper = False):
+	setting = str(values[name]) if name in values else default
+	if upper:
+		setting = setting.upper()
+	while not re.match(check, setting):
+		try:
+			setting = str(ask(prompt))
+		except NoAnswer:
+			break
+		if upper:
+			setting = setting.upper()
+		if not setting:
+			setting = default
+	return setting
+
+xy_bounds_check = '^NULL$|^c\s*\(\s*[0-9]+\s*,\s*[0-9]+\s*,\s*[0-9]+\s*,\s*[0-9]+\s*\)\s*$|^rbind\s*\((\s*c\s*\(\s*[0-9]+\s*,\s*[0-9]+\s*,\s*[0-9]+\s*,\s*[0-9]+\s*\)\s*,\s*)+\s*c\s*\(\s*[0-9]+\s*,\s*[0-9]+\s*,\s*[0-9]+\s*,\s*[0-9]+\s*\)\s*\)$'
+boolean_check = '^T$|^F$|^TRUE$|^FALSE$'
+number_check = '^Inf$|^-?[0-9]+(\.?[0-9]+)?$'
+bounds_check = '^c\s*\(\s*-?[0-9]*(\.[0-9]+)?\s*,\s*-?[0-9]*(\.[0-9]+)?\s*\)\s*$'
+start_flag_check = '^TRIALID$|^SYNCTIME$'
+start_pts_check = '^rbind\s*\(\s*(c\s*\(\s*[0-9]+\s*,\s*[0-9]+\s*\)){1}(\s*,\s*c\s*\(\s*[0-9]+\s*,\s*[0-9]+\s*\))*\s*\)$'
+
+# The fix_align settings, with their defaults (as in Cohen (2013), except for trial_plots), what they must match, the prompt if they don't, and whether they're case insensitive
+fa_setting_checks = [
+	('xy_bounds', "NULL", xy_bounds_check, "Error: xy_bounds improperly defined. Please enter xy_bounds: ", True),
+	('keep_y_var', "FALSE", boolean_check, "Error: invalid setting for keep_y_var. Please enter T or F: ", True),
+	('use_run_rule', "TRUE", boolean_check, "Error: invalid setting for use_run_rule. Please enter T or F: ", True),
+	('trial_plots', "FALSE", boolean_check, "Error: invalid setting for trial_plots. Please enter T or F: ", True),
+	('save_trial_plots', "FALSE", boolean_check, "Error: invalid setting for save_trial_plots. Please enter T or F: ", True),
+	('summary_file', "TRUE", boolean_check, "Error: invalid setting for whether to generate fix_align summary file. Please enter T or F: ", True),
+	('show_image', "FALSE", boolean_check, "Error: invalid setting for show_image. Please enter T or F: ", True),
+	('start_flag', "TRIALID", start_flag_check, "Error: invalid setting for start_flag. Please enter one of: TRIALID, SYNCTIME: ", True),
+	('den_sd_cutoff', "Inf", number_check, "Error: invalid setting for den_sd_cutoff. Please enter a number or 'Inf': ", False),
+	('den_ratio_cutoff', "1", number_check, "Error: invalid setting for den_ratio_cutoff. Please enter a number: ", False),
+	('k_bounds', "c(-.1, .1)", bounds_check, "Error: invalid setting for k_bounds. Please enter a 1 x 2 matrix of numbers in the format 'c(x, y)': ", False),
+	('o_bounds', "c(-50, 50)", bounds_check, "Error: invalid setting for o_bounds. Please enter a 1 x 2 matrix of numbers in the format 'c(x, y)': ", False),
+	('s_bounds', "c(1, 20)", bounds_check, "Error: invalid setting for s_bounds. Please enter a 1 x 2 matrix of numbers in the format 'c(x, y)': ", False),
+]
+
+# Get start_pts from the parameters and/or the script file, preferring whichever is formatted correctly
+def resolve_start_pts(values, script_loc, ask = input):
+	start_pts_regex = re.compile(start_pts_check)
+	start_pts = values.get('start_pts')
+	if start_pts is not None and script_loc and os.path.isfile(script_loc):
+		with open(script_loc, "r") as file:
+			script = file.read()
+			start_pts_param = str(start_pts).replace(" ", "")
+			start_pts_stim = "".join(re.findall("start_pts = (.*)", script)).replace(" ", "")
+			if not start_pts_regex.match(start_pts_param) and start_pts_regex.match(start_pts_stim):
+				print("start_pts in parameter file not correctly formatted. Using start_pts from script file.")
+				start_pts = start_pts_stim
+			elif not start_pts_regex.match(start_pts_stim) and start_pts_regex.match(start_pts_param):
+				print("start_pts from script file not correctly formatted. Using start_pts from parameters file.")
+				start_pts = start_pts_param
+			elif start_pts_param != start_pts_stim:
+				print("Warning: start_pts specified in both parameters file and script file. Using value from parameters file.")
+				start_pts = start_pts_param
+	elif start_pts is None and script_loc and os.path.isfile(script_loc):
+		with open(script_loc, "r") as file:
+			script = file.read()
+			start_pts = "".join(re.findall("start_pts = (.*)", script))
+			while not start_pts:
+				try:
+					start_pts = ask("Error: start_pts matrix not found in script. What is your start_pts matrix? ")
+				except NoAnswer:
+					return start_pts
+	elif start_pts is None:
+		try:
+			start_pts = str(ask("Error: start_pts not provided in script file. What is your start_pts matrix? "))
+		except NoAnswer:
+			return start_pts
+
+	while not start_pts_regex.match(str(start_pts)):
+		try:
+			start_pts = str(ask("Error: start_pts not formatted correctly. start_pts should be of the form 'rbind(c(x, y) [, c(x, y), ...])'. Please enter a valid start_pts matrix: "))
+		except NoAnswer:
+			break
+
+	return start_pts
+
+# Fill in defaults for the variables set in a parameters file and check them, asking for new values for any that are wrong
+# Only the settings needed for the stages in options are checked. Relative defaults are relative to base_dir
+# Raises PipelineError if existing results would be overwritten without options.overwrite
+def resolve_parameters(values, options, base_dir = default_dir, ask = input):
+	base_dir = Path(base_dir)
+	params = Parameters()
+
+	# In batch mode, errors are collected by ask and reported together, instead of stopping at the first one
+	def fail(message):
+		if isinstance(ask, BatchAsk):
+			ask.fail(message)
+		else:
+			raise PipelineError(message)
+
+	# If there is no asc_files_dir specified in the parameters file, assume it's in the base directory
+	# If the directory does not contain ASC files, prompt for one until we get one that does
+	# When watching it, it only has to exist, since ASCs are added to it as they're collected
+	asc_files_dir = values.get('asc_files_dir', base_dir / "ASC")
+	if not options.nofix or not options.nosentences or not options.noquestions:
+		while True:
+			if not asc_files_dir:
+				asc_files_dir = "."
+			try:
+				if len([f for f in os.listdir(asc_files_dir) if '.asc' in f]) > 0 or (options.watch and os.path.isdir(asc_files_dir)):
+					break
+			except Exception:
+				pass
+
+			try:
+				asc_files_dir = ask(f"Error: no ASC files found in '{asc_files_dir}'. If your ASC files have already been fix aligned, set the asc_files_dir to the location of your fix aligned files, and use the '--nofix' ('-nf') option. Please enter a directory containing ASC files: ")
+			except NoAnswer:
+				break
+			if not asc_files_dir:
+				asc_files_dir = base_dir / "ASC"
+	params.asc_files_dir = Path(asc_files_dir)
+
+	# Compressed ASCs are read as they are, but .zst files need the zstandard package
+	if not options.nofix or not options.nosentences or not options.noquestions:
+		missing = set(compression(f) for f in os.listdir(params.asc_files_dir) if '.asc' in f) if os.path.isdir(params.asc_files_dir) else set()
+		for kind in sorted(kind for kind in missing if not has_compression(kind)):
+			fail("Error: zstandard not found, which is needed to read the ." + kind + " ASC files in " + str(params.asc_files_dir) + ". Have you installed it with 'pip install zstandard'? Exiting...")
+
+	if not options.nosentences or not options.noquestions or not options.nocombine:
+		params.output_dir = Path(values.get('output_dir', base_dir / "prASCed results"))
+
+	params.set_output_locations(options.output_format)
+
+	# If we're combining results, the results file already exists, and we're not overwriting, exit
+	if not options.nocombine and os.path.isfile(params.combined_loc) and not options.overwrite:
+		fail("Error: " + params.combined_loc.name + " already exists in " + str(params.output_dir) + ". Use '--overwrite' ('-o') to overwrite existing " + params.combined_loc.name + " files. Exiting.")
+
+	# config.json is also needed to get the column names when combining
+	if not options.nosentences or not options.noquestions or not options.nocombine:
+		params.config_json_loc = resolve_file(values, 'config_json_loc', base_dir / "config.json", '.json', "Error: no SideEye config file found. Please enter a valid location: ", ask)
+
+	if not options.nosentences:
+		params.sentences_txt_loc = resolve_file(values, 'sentences_txt_loc', base_dir / "sentences.txt", '.txt', "Error: no sentences.txt file found. Please enter a valid location: ", ask)
+
+	# Where to keep ASC files parsed by SideEye and question scores, so they don't have to be worked out again
+	if not options.nosentences or not options.noquestions:
+		params.cache_dir = Path(values.get('cache_dir', params.output_dir / ".prASC cache"))
+
+	if not options.noquestions or not options.nofix:
+		start_flag = [setting for setting in fa_setting_checks if setting[0] == 'start_flag'][0]
+		params.fa_settings['start_flag'] = resolve_setting(values, *start_flag[:4], ask = ask, upper = True)
+
+	# Stimuli loc is optional, but print a warning if we're not using it, also check for file_encoding
+	if not options.nocombine:
+		if 'stimuli_loc' in values:
+			stimuli_loc = values['stimuli_loc']
+		else:
+			stimuli_loc = "".join([str(base_dir / f) for f in os.listdir(base_dir) if '-formatted.csv' in f])
+
+		if len(re.findall("-formatted.csv", str(stimuli_loc))) > 1:
+			print("Error: multiple stimuli files found. Not adding stimuli to results.")
+			stimuli_loc = ""
+		elif stimuli_loc:
+			stimuli_loc = with_extension(stimuli_loc, '.csv')
+			if not os.path.isfile(stimuli_loc):
+				print("Warning: stimuli-formatted.csv not found. Stimuli information will not be added to results.")
+				stimuli_loc = ""
+		else:
+			print("Warning: stimuli-formatted.csv not found. Stimuli information will not be added to results.")
+
+		params.stimuli_loc = Path(stimuli_loc) if stimuli_loc else None
+
+		# This can be determined automatically, but it takes a looooong time
+		params.file_encoding = values.get('file_encoding', 'latin1')
+
+	if not options.nofix:
+		params.fix_align_loc = resolve_file(values, 'fix_align_loc', base_dir / "fix_align_v0p92.r", '.r', "Error: no fix_align file found. Please enter a valid location: ", ask)
+
+		if 'script_loc' in values:
+			script_loc = values['script_loc']
+		else:
+			script_loc = "".join([str(base_dir / f) for f in os.listdir(base_dir) if '.script' in f])
+
+		if len(re.findall("\.script", str(script_loc).lower())) > 1:
+			print("Error: multiple script files found. Not importing start_pts from script.")
+			script_loc = ""
+
+		params.script_loc = with_extension(script_loc, '.script') if script_loc else None
+
+		params.fa_output_dir = Path(values.get('fa_output_dir', params.asc_files_dir / "Fix Aligned"))
+
+		for name, default, check, prompt, upper in fa_setting_checks:
+			if not name in params.fa_settings:
+				params.fa_settings[name] = resolve_setting(values, name, default, check, prompt, ask, upper)
+
+		# Fix aligned files can be written compressed, to save space
+		fa_compression = resolve_setting(values, 'fa_compression', "", compression_check, "Error: invalid setting for fa_compression. Please enter one of: gz, zst, xz, or nothing to write uncompressed files: ", ask)
+		params.fa_compression = fa_compression.lower() or None
+		if params.fa_compression == 'zst' and not has_compression('zst'):
+			fail("Error: zstandard not found, which is needed to write fix aligned files with fa_compression = 'zst'. Have you installed it with 'pip install zstandard'? Exiting...")
+
+		# start_pts is needed to tell whether the existing fix aligned files are up to date, and to align any that aren't
+		# It's got even if there aren't any ASCs yet, since with --watch they can arrive later
+		params.fa_settings['start_pts'] = resolve_start_pts(values, params.script_loc, ask)
+	else:
+		params.fa_output_dir = params.asc_files_dir
+
+	if not options.nosentences or not options.nocombine:
+		if os.path.isfile(params.results_loc) and not options.overwrite:
+			fail("Error: " + params.results_loc.name + " already exists in " + str(params.output_dir) + ". Use '--overwrite' ('-o') to overwrite existing results files. Exiting.")
+
+	if not options.noquestions or not options.nocombine:
+		if (os.path.isfile(params.subj_quest_file_name) or os.path.isfile(params.summary_file_name)) and not options.overwrite:
+			fail("Error: question results file(s) already exist in " + str(params.output_dir) + ". Use '--overwrite' ('-o') to overwrite existing results files. Exiting.")
+
+	return params
+
+# Get the ASCs in a directory that haven't been fix aligned
+def asc_files(asc_files_dir):
+	return [strip_quotes(str(Path(asc_files_dir) / f)) for f in os.listdir(asc_files_dir) if '.asc' in f and not '_fa.asc' in f]
+
+# The column names to use when joining results, from the settings in config.json
+class OutputColumns:
+	def __init__(self, config_json_loc):
+		with open(Path(config_json_loc), "r") as file:
+			config = json.load(file)
+
+		# Filter to the output that's included according to the config file. We need to do both since trial_output headers override region_output headers
+		self.trial_output_included = {field: settings for field, settings in config.get('trial_output', {}).items() if not ('exclude' in settings and settings['exclude'] == True)}
+		self.region_output_included = {field: settings for field, settings in config.get('region_output', {}).items() if not ('exclude' in settings and settings['exclude'] == True)}
+
+		self.filename_col_name = self.header('filename')
+		self.item_id_col_name = self.header('item_id')
+		self.item_condition_col_name = self.header('item_condition')
+
+		self.is_item_id_included = self.included('item_id')
+		self.is_filename_included = self.included('filename')
+		self.is_item_condition_included = self.included('item_condition')
+
+		# SideEye writes wide output unless wide_format is false. Results are always calculated long, and pivoted to wide when they're written out (see wide_pivot)
+		self.wide_format = config.get('wide_format', True) != False
+		self.measure_col_name = self.header('measure')
+		self.value_col_name = self.header('value')
+		# The measures in config.json. trial_measures is None if it doesn't list them, in which case SideEye calculates its default ones
+		self.trial_measures = config.get('trial_measures')
+		self.region_measures = config.get('region_measures', {})
+
+	def included(self, field):
+		return field in self.trial_output_included or field in self.region_output_included
+
+	def header(self, field):
+		if field in self.trial_output_included:
+			return self.trial_output_included[field]['header']
+		elif field in self.region_output_included:
+			return self.region_output_included[field]['header']
+		return field
+
+# Get the WidePivot (see combine.py) that turns results into wide format, using the measures and headers in config.json
+def wide_pivot(columns):
+	from .combine import WidePivot, region_fields, default_trial_measures
+
+	trial_measures = columns.trial_measures if columns.trial_measures is not None else {measure: {} for measure in default_trial_measures}
+	measures = {**trial_measures, **columns.region_measures}
+	headers = {measure: settings['header'] for measure, settings in measures.items() if isinstance(settings, dict) and 'header' in settings}
+	region_cols = [columns.header(field) for field in region_fields if columns.included(field)]
+	return WidePivot(columns.measure_col_name, columns.value_col_name, trial_measures, columns.region_measures, region_cols, headers)
+
+# Pivot results.csv to wide format in place (a chunk at a time if chunksize is set), for when it isn't combined, which would pivot it
+# SideEye (and merge_results) write results.csv with the default encoding, so that's what it's read back in with
+def pivot_results(csv_loc, columns, chunksize):
+	from .combine import load_results, combine_in_chunks
+	import locale
+
+	pivot = wide_pivot(columns)
+	encoding = locale.getpreferredencoding(False)
+	tmp_loc = Path(csv_loc).with_name('.tmp_' + Path(csv_loc).name)
+	try:
+		if chunksize > 0:
+			combine_in_chunks(csv_loc, encoding, None, None, [], tmp_loc, chunksize, pivot)
+		else:
+			formats.write_table(pivot(load_results(csv_loc, encoding, columns.trial_output_included, columns.region_output_included)), tmp_loc, 'csv')
+		os.replace(tmp_loc, csv_loc)
+	except ValueError as e:
+		print("Error: " + Path(csv_loc).name + " has " + str(e) + ". Leaving it in long format.")
+	finally:
+		if os.path.isfile(tmp_loc):
+			os.remove(tmp_loc)
+
+# Fix align the ASCs that don't have up to date fix aligned versions
+# Returns the ASC files to analyze: the fix aligned ones, or the original ones if we're not fix aligning
+def fix_align_stage(params, options, run_report):
+	if options.nofix:
+		return [str(Path(params.fa_output_dir) / f) for f in os.listdir(params.fa_output_dir) if '.asc' in f]
+
+	from .fix_align import run_fix_align
+
+	to_align_list, fa_entries, fa_params = prepare_fix_align(params, options)
+
+	# If there are ASC files to process, process them
+	if to_align_list:
+		# Split the files into shards, and run each one in its own Rscript process (up to --jobs at once)
+		# Files that fail are reported, but don't stop the others from being fix aligned
+		print("Processing ASC files with fix_align...")
+		stage = run_report.start('fix_align', to_align_list)
+		fa_failures = run_fix_align(to_align_list, params.fix_align_loc, fa_params, params.fa_output_dir, options.jobs, persistent = options.rworker, fa_compression = params.fa_compression)
+		finish_fix_align(params, run_report, stage, to_align_list, fa_entries, fa_failures)
+	else:
+		# There aren't any asc files to process, so print a message to that effect
+		print("All ASC files have up to date fix aligned versions. Skipping fix_align. Use '--refix' ('-r') to re-fix align ASCs.")
+
+	return fa_files(params.fa_output_dir)
+
+# The fix aligned ASCs in fa_output_dir
+def fa_files(fa_output_dir):
+	return [str(Path(fa_output_dir) / f) for f in os.listdir(fa_output_dir) if '_fa.asc' in f]
+
+# Work out which ASCs need to be fix aligned, according to the manifest in fa_output_dir (or all of them if we're refix aligning)
+# Returns them, along with the manifest entries to record for them once they're aligned, and the fix_align arguments to use
+def prepare_fix_align(params, options):
+	from .fix_align import files_to_align, fa_params_hash
+
+	fa_output_dir = params.fa_output_dir
+	if not os.path.exists(fa_output_dir):
+		os.makedirs(fa_output_dir)
+
+	asc_list = asc_files(params.asc_files_dir)
+	fa_params = dict(params.fa_settings, start_flag = strip_quotes(params.fa_settings['start_flag']))
+
+	to_align_list = []
+	fa_entries = {}
+	if asc_list:
+		to_align_list, fa_entries = files_to_align(asc_list, fa_output_dir, fa_params_hash(fa_params, params.fix_align_loc), options.refix, params.fa_compression)
+
+	# Get rid of the old summary files if we're refix aliging files. If we're not, then we're only
+	# Fix aligning files that don't have existing ones, and we might want to keep the old summary
+	if to_align_list and options.refix:
+		old_fas = [Path(fa_output_dir) / file for file in os.listdir(Path(fa_output_dir)) if '.fas' in file]
+		try:
+			for file in old_fas:
+				os.remove(file)
+		except Exception:
+			print("Unable to delete old fas files.")
+
+	return to_align_list, fa_entries, fa_params
+
+# Report the files that fix_align failed for, and record the ones that were aligned in the manifest
+# Older fix aligned versions of the files that failed are removed, so they aren't analyzed as if they were up to date
+def finish_fix_align(params, run_report, stage, to_align_list, fa_entries, fa_failures):
+	from .fix_align import update_manifest, remove_fa_files
+
+	for file in to_align_list:
+		run_report.add_file(stage, file, status = 'failed' if file in fa_failures else 'aligned')
+	run_report.finish(stage, failed = len(fa_failures))
+	if fa_failures:
+		print("Error: fix_align failed for " + str(len(fa_failures)) + " of " + str(len(to_align_list)) + " ASC files. These will not be analyzed:")
+		for file, error in fa_failures.items():
+			removed = remove_fa_files(file, params.fa_output_dir)
+			print("  " + os.path.basename(file) + ": " + error + (" (removed the older fix aligned " + ", ".join(removed) + ")" if removed else ""))
+
+	update_manifest(params.fa_output_dir, fa_entries, fa_failures)
+
+# Process the ASC files with SideEye, writing the results to the output directory
+# If the ASCs were streamed (see streaming.py), streamed has the results cache they were measured into, and how long each one took
+def sentences_stage(params, options, file_list, run_report, streamed = None):
+	if os.path.isfile(params.results_loc) and not options.overwrite:
+		print("Error: " + params.results_loc.name + " already exists in " + str(params.output_dir) + ". Use '--overwrite' ('-o') to overwrite existing " + params.results_loc.name + " files. Not processing ASC files with SideEye.")
+		return
+
+	try:
+		sideeye = timed_import('sideeye')
+	except ImportError:
+		raise MissingDependency("Error: sideeye not found. Have you installed it with 'pip install sideeye'?")
+
+	from .sideeye_cache import load_config
+	sideEyeConfig = load_config(params.config_json_loc)
+	csv_loc = params.csv_loc
+
+	print("Processing ASC files with SideEye (this may take a while)...")
+
+	if streamed is not None:
+		# Put results.csv together from the results for each ASC, calculating any that weren't streamed (like older fix aligned files)
+		from .sideeye_cache import calculate_all_measures_cached
+		cache_dir, measured = streamed
+		stage = run_report.start('sideeye', file_list, profile = True)
+		timings = calculate_all_measures_cached(file_list, params.sentences_txt_loc, params.config_json_loc, sideEyeConfig, cache_dir, csv_loc, options.jobs, measured)
+		for file in file_list:
+			run_report.add_file(stage, file, **dict(timings.get(file, {'cached': True}), streamed = file in measured))
+		run_report.finish(stage, processed = len(timings))
+	elif options.nocache and options.jobs > 1:
+		# Split the files into chunks to process in parallel, then merge the results in order
+		from .sideeye_cache import calculate_all_measures_parallel
+		stage = run_report.start('sideeye', file_list, profile = True)
+		chunks = calculate_all_measures_parallel(file_list, params.sentences_txt_loc, params.config_json_loc, sideEyeConfig, csv_loc, options.jobs)
+		run_report.finish(stage, chunks = chunks)
+	elif options.nocache:
+		from .sideeye_cache import parse_files
+		stage = run_report.start('sideeye_parse', file_list, profile = True)
+		experiments = parse_files(file_list, params.sentences_txt_loc, sideEyeConfig)
+		run_report.finish(stage)
+		stage = run_report.start('sideeye_measures', profile = True)
+		sideeye.calculate_all_measures(experiments, csv_loc, sideEyeConfig)
+		run_report.finish(stage)
+	else:
+		# Only process ASCs that are new or have changed since the last run (in parallel if we have multiple jobs), then put results.csv back together
+		from .sideeye_cache import calculate_all_measures_cached
+		stage = run_report.start('sideeye', file_list, profile = True)
+		timings = calculate_all_measures_cached(file_list, params.sentences_txt_loc, params.config_json_loc, sideEyeConfig, params.cache_dir, csv_loc, options.jobs)
+		for file in file_list:
+			run_report.add_file(stage, file, **timings.get(file, {'cached': True}))
+		run_report.finish(stage, processed = len(timings))
+
+	# Combining pivots results to wide, so if they aren't being combined, pivot them here
+	columns = OutputColumns(params.config_json_loc)
+	if options.nocombine and columns.wide_format:
+		stage = run_report.start('pivot_results', [csv_loc], profile = True)
+		pivot_results(csv_loc, columns, options.chunksize)
+		run_report.finish(stage)
+
+	if options.output_format != 'csv':
+		stage = run_report.start('convert_results', [csv_loc])
+		formats.convert_results(csv_loc, params.results_loc, options.output_format, params.config_json_loc)
+		run_report.finish(stage)
+
+# Score the questions in the ASC files, and write out the question info and a summary for each file
+# Unless options.nocache is set, files that haven't changed since they were last scored aren't read again,
+# and files that have are scored from their trial index (see asc_index.py) rather than read through
+# If the ASCs were streamed (see streaming.py), scored has the scores for the ones that were scored then, and how long each one took
+def questions_stage(params, options, columns, file_list, run_report, scored = {}):
+	from .questions import score_questions, score_questions_indexed, summary_row, cached_scores, cache_scores, load_question_cache, save_question_cache
+
+	print("Creating question summaries...")
+
+	subj_quest_lines = [columns.filename_col_name + " question_type " + columns.item_id_col_name + " correct_answer response was_response_correct response_RT\n"]
+	summary_lines = [columns.filename_col_name + ' s_number_questions s_num_correct_answers s_total_prop_correct\n']
+
+	for file in file_list:
+		if not os.path.isfile(file):
+			raise PipelineError("File %s could not be found." %file)
+
+	start_flag = strip_quotes(params.fa_settings['start_flag'])
+	use_cache = not options.nocache and params.cache_dir is not None
+	cache = load_question_cache(params.cache_dir) if use_cache else {}
+	scores = {file: cached_scores(cache, file, start_flag) for file in file_list} if use_cache else {}
+	stale = [file for file in file_list if scores.get(file) is None]
+	to_score = [file for file in stale if not file in scored]
+
+	# Score each file that isn't cached in a single pass (in parallel if we have multiple jobs), and collect the lines to write out
+	# Lines are collected in the order of file_list, so the output is the same no matter how many jobs are used
+	stage = run_report.start('questions', to_score, profile = True)
+	scorer = score_questions if options.nocache else score_questions_indexed
+	results = dict(zip(to_score, parallel.ordered_map(timed_call, to_score, (scorer, start_flag), options.jobs)))
+	for file in stale:
+		score, timing = scored[file] if file in scored else results[file]
+		scores[file] = score
+		run_report.add_file(stage, file, questions = score[1], **timing)
+		if file in scored:
+			run_report.add_file(stage, file, streamed = True)
+		if use_cache:
+			cache_scores(cache, file, start_flag, score)
+
+	if use_cache and stale:
+		save_question_cache(cache, params.cache_dir)
+
+	for file in file_list:
+		rows, qcount, acount = scores[file]
+		if options.verbose:
+			print(file)
+
+		for output_line in rows:
+			subj_quest_lines.append(' '.join(output_line) + '\n')
+
+		if options.verbose:
+			print(file,qcount,acount,float(acount/qcount))
+
+		subj_sum_join = ' '.join(summary_row(file, qcount, acount))
+		summary_lines.append(subj_sum_join + '\n')
+
+	formats.write_question_table(subj_quest_lines, params.subj_quest_file_name, options.output_format)
+	formats.write_question_table(summary_lines, params.summary_file_name, options.output_format)
+	run_report.finish(stage, cached = len(file_list) - len(stale))
+
+# Combine the results, questions, and stimuli into one file, and delete the files that were combined unless options.keepall is set
+def combine_stage(params, options, columns, run_report):
+	if options.noquestions and not options.nosentences:
+		print("Combining pre-existing question files. Assuming column names as specified in " + params.config_json_loc.name + ", and filenames '" + params.subj_quest_file_name.name + "', '" + params.summary_file_name.name + "'. Assuming files are located in " + str(params.output_dir) + ".")
+	elif options.nosentences and not options.noquestions:
+		print("Combining pre-existing results. Assuming column names as specified in " + params.config_json_loc.name + ", and filename '" + params.results_loc.name + "'. Assuming results file is located in " + str(params.output_dir) + '.')
+	elif options.nosentences and options.noquestions:
+		print("Combining pre-existing results. Assuming column names as specified in " + params.config_json_loc.name + ", and filenames '" + params.subj_quest_file_name.name + "', '" + params.summary_file_name.name + "', '" + params.results_loc.name + "'. Assuming files are located in " + str(params.output_dir) + '.')
+
+	if (not os.path.isfile(params.subj_quest_file_name) and 
+		not os.path.isfile(params.summary_file_name) and 
+		not os.path.isfile(params.results_loc)):
+		raise PipelineError("No results found to combine. Exiting...")
+
+	print("Combining results...")
+	pandas = timed_import('pandas')
+	from .combine import load_results, validate_stimuli, describe_problems, combine_in_chunks, duplicated_keys, describe_keys, Lookup
+	from .instrument import peak_rss_mb
+	has_stimuli = params.stimuli_loc is not None and os.path.isfile(params.stimuli_loc)
+	stage = run_report.start('combine', [loc for loc in [params.results_loc, params.subj_quest_file_name, params.summary_file_name, params.stimuli_loc] if loc is not None and os.path.isfile(loc)], profile = True)
+
+	# Print out what's wrong with the stimuli file, if anything
+	def print_stimuli_report(stimuli_report):
+		for col, problems in stimuli_report.items():
+			col_type = "item conditions" if col == columns.item_condition_col_name else "item ids"
+			print("Error: stimuli file has improperly specified " + col_type + " (" + describe_problems(problems) + "). Not combining stimuli with results.")
+
+	# Read in the stimuli, and give their id columns the names used in results
+	# Returns None if they don't have the columns needed to join them on keys, or if they have more than one row for some items
+	def load_stimuli(keys):
+		stimuli = pandas.read_csv(params.stimuli_loc, encoding = params.file_encoding)
+		for field, col in [('item_id', columns.item_id_col_name), ('item_condition', columns.item_condition_col_name)]:
+			if not col in keys:
+				continue
+			# If the columns exist, check whether to rename them
+			if not field in stimuli.columns and not col in stimuli.columns:
+				print(field + " not included in stimuli. Cannot combine results and stimuli.")
+				return None
+			elif not col in stimuli.columns:
+				stimuli.rename(columns = {field: col}, inplace = True)
+
+		duplicates = duplicated_keys(stimuli, keys)
+		if duplicates:
+			print("Error: stimuli file has more than one row for some items (" + ", ".join(keys) + ": " + describe_keys(duplicates) + "). Not combining stimuli with results.")
+			return None
+		return stimuli
+
+	# Check if the columns we need to conjoin the output are included in the output, and if not, exit
+	if not columns.is_item_id_included:
+		raise PipelineError("item_id not included in results. Cannot combine results.")
+
+	# The columns results are joined with the questions and the questions summary on
+	question_keys = [columns.filename_col_name, columns.item_id_col_name]
+	summary_keys = [columns.filename_col_name]
+
+	# Set variables corresponding to whether any results were combined to false
+	combined_s_subj_quest = False
+	combined_s_questsum = False
+	combined_s_stimuli = False
+	combined_q_stimuli = False
+	combined_q_questsum = False
+	# Whether results were pivoted to wide format (see wide_pivot)
+	pivoted = False
+	# Whether results_combined.csv was already written out chunk by chunk
+	chunked = False
+
+	# If we have sentences
+	if os.path.isfile(params.results_loc):
+		# Combine results.csv a chunk at a time if asked to, so it never has to be held in memory all at once
+		# This can't be done when only the questions summary is being combined, since that keeps rows that aren't in results.csv
+		chunked = options.chunksize > 0
+		if chunked and not os.path.isfile(params.subj_quest_file_name) and os.path.isfile(params.summary_file_name) and columns.is_filename_included:
+			print("Warning: results can't be combined with only the questions summary in chunks. Combining in memory...")
+			chunked = False
+
+		if not chunked:
+			peak_before = peak_rss_mb()
+			# Columnar results keep the compact types they were converted with, so they can be read in as they are
+			if options.output_format == 'csv':
+				results = load_results(params.results_loc, params.file_encoding, columns.trial_output_included, columns.region_output_included)
+			else:
+				results = formats.read_table(params.results_loc, options.output_format)
+			if options.verbose:
+				print("Loaded " + params.results_loc.name + ": " + str(len(results)) + " rows, " + str(round(results.memory_usage(deep = True).sum() / (1024 * 1024), 1)) + " MB in memory.")
+				if peak_before is not None:
+					print("Peak memory use: " + str(round(peak_before, 1)) + " MB before loading " + params.results_loc.name + ", " + str(round(peak_rss_mb(), 1)) + " MB after.")
+
+		# Results are pivoted to wide before anything is joined onto them, so the joins have a row for each region rather than one for each measure
+		# (results.csv that SideEye already wrote out wide, e.g. from an older run, is left as it is)
+		pivot = wide_pivot(columns) if columns.wide_format else None
+		if pivot is not None and not pivot.is_long(results.columns if not chunked else pandas.read_csv(params.results_loc, nrows = 0, encoding = params.file_encoding).columns):
+			pivot = None
+		if pivot is not None and not chunked:
+			try:
+				results = pivot(results)
+				pivoted = True
+			except ValueError as e:
+				print("Error: " + params.results_loc.name + " has " + str(e) + ". Not pivoting results to wide format.")
+				pivot = None
+
+		questions = None
+		stimuli = None
+		stimuli_keys = [columns.item_id_col_name, columns.item_condition_col_name]
+		# If we have questions and we have the right column to join them on
+		# Each question is joined onto the results for its trial, so there must be only one for each file and item
+		if os.path.isfile(params.subj_quest_file_name) and os.path.isfile(params.summary_file_name) and columns.is_filename_included:
+			questions = formats.read_table(params.subj_quest_file_name, options.output_format, sep = " ", encoding = params.file_encoding)
+			questions = questions[questions['question_type'] != 1]
+			subj_questions = formats.read_table(params.summary_file_name, options.output_format, sep = " ", encoding = params.file_encoding)
+			questions = pandas.merge(questions, subj_questions, how = 'right', on = summary_keys, validate = 'many_to_one')
+			duplicates = duplicated_keys(questions, question_keys)
+			if duplicates:
+				print("Error: more than one question for some trials (" + ", ".join(question_keys) + ": " + describe_keys(duplicates) + "). Not combining results and questions.")
+				questions = None
+			else:
+				questions = Lookup(questions, question_keys, 'question')
+				if not chunked:
+					results = questions.join(results)
+					combined_s_subj_quest = True
+					combined_s_questsum = True
+		elif os.path.isfile(params.summary_file_name) and columns.is_filename_included:
+			questions = formats.read_table(params.summary_file_name, options.output_format, sep = " ", encoding = params.file_encoding)
+			results = pandas.merge(results, questions, how = 'right', on = summary_keys, validate = 'many_to_one')
+			combined_s_questsum = True
+			questions = None
+		elif not columns.is_filename_included:
+			print("filename not included in results. Cannot combine results and questions.")
+		# If we have stimuli and the right column to join them on (add checks for blank values or incorrect values)
+		if has_stimuli and columns.is_item_condition_included:
+			stimuli = load_stimuli(stimuli_keys)
+
+			# Check that the columns needed are formatted correctly
+			if stimuli is not None and not chunked:
+				stimuli_report = validate_stimuli(stimuli, results, stimuli_keys)
+				if not stimuli_report:
+					results = Lookup(stimuli, stimuli_keys, 'stimuli').join(results)
+					combined_s_stimuli = True
+				else:
+					print_stimuli_report(stimuli_report)
+
+		elif not columns.is_item_condition_included:
+			print("item_condition not included in results. Cannot combine results with stimuli.")
+
+		# The stimuli are checked against results.csv as it is read, and the combined results are written out chunk by chunk
+		if chunked:
+			try:
+				combined_s_subj_quest, combined_s_stimuli, stimuli_report = combine_in_chunks(params.results_loc, params.file_encoding, questions, stimuli, stimuli_keys, params.combined_loc, options.chunksize, pivot)
+				pivoted = pivot is not None
+			except ValueError as e:
+				# This is only found partway through, so start over without pivoting
+				print("Error: " + params.results_loc.name + " has " + str(e) + ". Not pivoting results to wide format.")
+				combined_s_subj_quest, combined_s_stimuli, stimuli_report = combine_in_chunks(params.results_loc, params.file_encoding, questions, stimuli, stimuli_keys, params.combined_loc, options.chunksize)
+			combined_s_questsum = combined_s_subj_quest
+			print_stimuli_report(stimuli_report)
+			if options.verbose and peak_rss_mb() is not None:
+				print("Peak memory use after combining results.csv in chunks of " + str(options.chunksize) + " rows: " + str(round(peak_rss_mb(), 1)) + " MB.")
+	# If we have questions (but no sentences)		
+	elif os.path.isfile(params.subj_quest_file_name):
+		results = formats.read_table(params.subj_quest_file_name, options.output_format, sep = " ", encoding = params.file_encoding)
+		results = results[results['question_type'] != 1]
+
+		if os.path.isfile(params.summary_file_name):
+			subj_questions = formats.read_table(params.summary_file_name, options.output_format, sep = " ", encoding = params.file_encoding)
+			results = pandas.merge(results, subj_questions, how = 'right', on = summary_keys, validate = 'many_to_one')
+			combined_q_questsum = True
+
+		# If we have stimuli (add checks for blank values or incorrect values)
+		# A question's question_type is the condition of its trial, so the stimuli are joined on it as item_condition,
+		# unless they don't have conditions (one row for each item), in which case they're joined on item_id alone
+		if has_stimuli:
+			stimuli_columns = pandas.read_csv(params.stimuli_loc, encoding = params.file_encoding, nrows = 0).columns
+			has_conditions = 'item_condition' in stimuli_columns or columns.item_condition_col_name in stimuli_columns
+			question_stimuli_keys = [columns.item_id_col_name, columns.item_condition_col_name] if has_conditions else [columns.item_id_col_name]
+			stimuli = load_stimuli(question_stimuli_keys)
+
+			if stimuli is not None:
+				# The condition column is only there to join on, and is dropped again afterwards
+				keyed = results.assign(**{columns.item_condition_col_name: results['question_type']}) if has_conditions else results
+				stimuli_report = validate_stimuli(stimuli, keyed, question_stimuli_keys)
+				if not stimuli_report:
+					results = Lookup(stimuli, question_stimuli_keys, 'stimuli').join(keyed)
+					if has_conditions:
+						results = results.drop(columns = columns.item_condition_col_name)
+					combined_q_stimuli = True
+				else:
+					print_stimuli_report(stimuli_report)
+
+	# If any combining (or pivoting) happened
+	if pivoted or combined_s_subj_quest or combined_s_questsum or combined_s_stimuli or combined_q_stimuli or combined_q_questsum:
+		# Write out the combined results
+		print("Writing out combined output...")
+		if not chunked:
+			formats.write_table(results, params.combined_loc, options.output_format)
+			stage['rows_written'] = len(results)
+		# Then delete the appropriate files if we're not keeping them
+		if not options.keepall:
+			# If we combined the sentences into the results, delete them
+			if pivoted or combined_s_subj_quest or combined_s_questsum or combined_s_stimuli:
+				try:
+					os.remove(params.results_loc)
+				except Exception:
+					print("Unable to delete non-combined results file.")
+
+			# If we combined the questions into the results, delete them
+			if combined_s_subj_quest or combined_q_stimuli:
+				try:
+					os.remove(params.subj_quest_file_name)
+				except Exception:
+					print("Unable to delete non-combined questions file.")
+
+			if combined_s_questsum or combined_q_questsum:
+				try:
+					os.remove(params.summary_file_name)
+				except Exception:
+					print("Unable to delete non-combined questions summary file.")
+
+	run_report.finish(stage)
+
+# Work out what each stage in options would do with resolved parameters, without running anything or writing any files
+# Returns a list of (stage, files read, files written, files deleted) for the stages that would run
+def plan(params, options):
+	steps = []
+
+	if options.nofix:
+		file_list = [str(Path(params.fa_output_dir) / f) for f in os.listdir(params.fa_output_dir) if '.asc' in f]
+	else:
+		from .fix_align import fa_params_hash, planned_alignments
+
+		asc_list = asc_files(params.asc_files_dir)
+		fa_params = dict(params.fa_settings, start_flag = strip_quotes(params.fa_settings['start_flag']))
+		to_align_list = planned_alignments(asc_list, params.fa_output_dir, fa_params_hash(fa_params, params.fix_align_loc), options.refix, params.fa_compression) if asc_list else []
+		steps.append(('fix_align', to_align_list, [str(Path(params.fa_output_dir) / fa_name(file, params.fa_compression)) for file in to_align_list], []))
+
+		# Files that will be realigned replace their existing versions, even if those are compressed differently
+		realigned = set(uncompressed_name(os.path.basename(file)) for file in steps[-1][2])
+		existing = [str(Path(params.fa_output_dir) / f) for f in os.listdir(params.fa_output_dir) if '_fa.asc' in f and not uncompressed_name(f) in realigned] if os.path.isdir(params.fa_output_dir) else []
+		file_list = sorted(set(existing) | set(steps[-1][2]))
+
+	if not options.nosentences:
+		steps.append(('sentences', file_list + [str(params.sentences_txt_loc), str(params.config_json_loc)], [str(params.results_loc)], []))
+
+	if not options.noquestions:
+		steps.append(('questions', file_list, [str(params.subj_quest_file_name), str(params.summary_file_name)], []))
+
+	if not options.nocombine:
+		# Files written by earlier stages will be there by the time results are combined
+		written = set(file for step in steps for file in step[2])
+		inputs = [str(loc) for loc in [params.results_loc, params.subj_quest_file_name, params.summary_file_name] if os.path.isfile(loc) or str(loc) in written]
+		removed = [] if options.keepall else list(inputs)
+		if params.stimuli_loc is not None:
+			inputs.append(str(params.stimuli_loc))
+		steps.append(('combine', inputs, [str(params.combined_loc)], removed))
+
+	return steps
+
+# Print out a plan from plan(). The files for each stage are only listed one by one if verbose is set
+def print_plan(steps, verbose = False):
+	print("Dry run: these stages would be run. Nothing has been run or written.")
+	for stage, reads, writes, removes in steps:
+		if len(writes) > 3:
+			written = str(len(writes)) + " files"
+		else:
+			written = ", ".join(os.path.basename(file) for file in writes) or "nothing"
+		print(stage + ": reads " + str(len(reads)) + " files, writes " + written)
+		if verbose:
+			for file in reads:
+				print("  read:   " + file)
+			for file in writes:
+				print("  write:  " + file)
+		for file in removes:
+			print("  delete: " + file + " (use '--keepall' ('-k') to keep it)")
+
+# Run the stages in options for an experiment with resolved parameters, and write out a run report
+# Returns the location of the run report, or None if there was nothing to do
+def run(params, options, run_report = None):
+	if options.nothing_to_do():
+		print("Nothing to do with all of nofix, nosentences, noquestions, and nocombine set. Exiting...")
+		return None
+
+	if run_report is None:
+		run_report = RunReport(options.as_dict(), options.profile)
+
+	check_dependencies(options)
+
+	# Get correct names for columns to use when joining results from the settings in the config file
+	columns = None
+	if not options.noquestions or not options.nocombine:
+		columns = OutputColumns(params.config_json_loc)
+
+	if options.stream:
+		# Each ASC goes through fix_align, question scoring, and SideEye as soon as it's ready, instead of waiting for every other ASC at each stage
+		from .streaming import stream_stages
+		stream_stages(params, options, columns, run_report)
+	else:
+		file_list = fix_align_stage(params, options, run_report)
+
+		if not options.nosentences:
+			sentences_stage(params, options, file_list, run_report)
+
+		if not options.noquestions:
+			questions_stage(params, options, columns, file_list, run_report)
+
+	if not options.nocombine:
+		combine_stage(params, options, columns, run_report)
+
+	# Write out the run report to the output directory (or the fix aligned ASC directory if we only ran fix_align)
+	report_loc = run_report.write(params.output_dir if params.output_dir is not None else params.fa_output_dir)
+	if options.verbose or options.profile:
+		print("Run report written to " + str(report_loc) + ".")
+
+	return report_loc
+
+# The parameters that are locations of files or directories
+location_parameters = ['asc_files_dir', 'output_dir', 'cache_dir', 'config_json_loc', 'sentences_txt_loc', 'stimuli_loc', 'fix_align_loc', 'script_loc', 'fa_output_dir']
+
+# Make the relative locations set in a parameters file relative to relative_dir, instead of the current directory
+def relative_locations(values, relative_dir):
+	return {name: Path(relative_dir) / value if name in location_parameters and value and not os.path.isabs(value) else value for name, value in values.items()}
+
+# Read in a parameters file and resolve it for the stages in options
+# Relative locations set in the file are relative to relative_dir, or the current directory if it's None
+# In batch mode, never ask for anything. Check all of the parameters, and raise a PipelineError with everything that's wrong at once
+# The output directory is only made once all of the parameters have been checked
+def load_parameters(parameters_loc, options, base_dir = default_dir, ask = input, relative_dir = None):
+	if options.batch:
+		ask = BatchAsk()
+
+	try:
+		values = read_parameters_file(parameters_loc, ask)
+	except NoAnswer:
+		ask.check(parameters_loc)
+	if relative_dir is not None:
+		values = relative_locations(values, relative_dir)
+	params = resolve_parameters(values, options, base_dir, ask)
+	if options.batch:
+		ask.check(parameters_loc)
+
+	if params.output_dir is not None and not os.path.exists(params.output_dir) and not options.dry_run:
+		os.makedirs(params.output_dir)
+
+	return params
+
+# Read in a parameters file, resolve it and options, and run the experiment
+# Relative defaults in the parameters are relative to base_dir. ask is used to ask for settings that are missing or wrong, unless options.batch is set
+# Returns the location of the run report, or None if there was nothing to do or options.dry_run is set
+def run_experiment(parameters_loc, options = None, base_dir = default_dir, ask = input):
+	options = (options if options is not None else Options()).resolve()
+	if options.nothing_to_do():
+		return run(None, options)
+
+	run_report = RunReport(options.as_dict(), options.profile)
+	check_dependencies(options)
+	params = load_parameters(parameters_loc, options, base_dir, ask)
+
+	if options.dry_run:
+		print_plan(plan(params, options), options.verbose)
+		print("Planned in " + str(round(time.perf_counter() - run_report.start_wall, 3)) + "s.")
+		return None
+
+	return run(params, options, run_report)
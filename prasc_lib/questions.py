@@ -0,0 +1,92 @@
+##############################################################################################
+########## Question scoring for prASC.py, based on question_acc.py by Brian Dillon ###########
+##############################################################################################
+
+import os
+from pathlib import Path
+
+from .cache import load_manifest, save_manifest
+from .compressed import open_asc
+
+# Records the scores for each ASC in the cache directory, so ASCs that haven't changed don't have to be read again
+questions_name = 'questions.json'
+
+# Read through a single ASC file once and score its questions. Compressed ASCs are decompressed as they're read
+# Returns the rows for subject_question_info.txt (as lists of strings), the number of questions, and the number of correct answers
+def score_questions(file, start_flag = 'TRIALID'):
+	with open_asc(file, 'r') as asc:
+		# TRIALID/SYNCTIME, QUESTION_ANSWER, and TRIAL_RESULT are all EyeLink messages, so skip everything else (samples, fixations, etc.) with one cheap check
+		return score_lines(file, (line for line in asc if line[:3] == 'MSG'), start_flag)
+
+# Score the questions in an ASC file from its trial index (see asc_index.py), which has every message line score_questions would use
+# The index is built (and saved next to the file) if it's missing or out of date, so only the first run reads through the whole file
+def score_questions_indexed(file, start_flag = 'TRIALID'):
+	from .asc_index import load_index
+	return score_lines(file, (entry[3] for entry in load_index(file)), start_flag)
+
+# Score the questions for a file from its message lines
+def score_lines(file, lines, start_flag = 'TRIALID'):
+	rows = []
+	qcount = 0		# count of questions
+	acount = 0		# count of accurate answers
+	correct = 'none'
+
+	for line in lines:
+		# Check in the same order as before, so lines with more than one marker are treated the same way
+		if start_flag in line:
+			correct = 'none'
+
+			fields = line.split()
+			start_time = int(fields[1])
+			trialid = fields[3]
+			first_split = trialid.split('I')#split into the condition, and then item and dependent
+			condition = first_split[0]
+			cond_num = condition[1:] #strip off the letter from the beginning of condition
+			second_split = first_split[1].split('D')#split into item and dependent
+			item_num = second_split[0]
+
+		elif 'QUESTION_ANSWER' in line:
+			fields = line.split()
+			correct = fields[3]
+
+		elif 'TRIAL_RESULT' in line:
+			fields = line.split()
+			end_time = int(fields[1])
+			answer = fields[3]
+
+			# Keep the line, if the item had a question
+			if correct != 'none':
+				qcount = qcount + 1
+				was_response_correct = "FALSE"
+				if correct == answer:
+					was_response_correct = "TRUE"
+					acount = acount + 1
+				rows.append(['"' + str(file) + '"', cond_num, item_num, correct, answer, was_response_correct, str(end_time - start_time)])
+
+	return rows, qcount, acount
+
+# Get the line for question_summary.txt from the counts for one file
+def summary_row(file, qcount, acount):
+	return ['"' + str(file) + '"', str(qcount), str(acount), str(float(acount/qcount))]
+
+# Get the cached scores for a file from the question cache, or None if it has been touched or was scored with a different start_flag
+# Scores are kept by the file's name as given, since that's written out with them
+def cached_scores(cache, file, start_flag):
+	entry = cache.get(str(file))
+	stat = os.stat(file)
+	if entry and entry.get('size') == stat.st_size and entry.get('mtime') == stat.st_mtime_ns and entry.get('start_flag') == start_flag:
+		return entry['rows'], entry['qcount'], entry['acount']
+	return None
+
+def cache_scores(cache, file, start_flag, scores):
+	stat = os.stat(file)
+	rows, qcount, acount = scores
+	cache[str(file)] = {'size': stat.st_size, 'mtime': stat.st_mtime_ns, 'start_flag': start_flag, 'rows': rows, 'qcount': qcount, 'acount': acount}
+
+def load_question_cache(cache_dir):
+	return load_manifest(Path(cache_dir) / questions_name)
+
+def save_question_cache(cache, cache_dir):
+	if not os.path.exists(cache_dir):
+		os.makedirs(cache_dir)
+	save_manifest(cache, Path(cache_dir) / questions_name)
@@ -0,0 +1,136 @@
+##############################################################################################
+############# Running prASC.py on many experiments at once, in a single process ##############
+##############################################################################################
+
+# Each experiment is run in its own thread, so pandas, SideEye, and the R workers for fix_align are only loaded once for all of them
+# All experiments share one pool of --jobs worker processes, and at most --jobs R processes run at a time (see parallel.shared_pool)
+# Every parameters file is checked (in batch mode) before anything is run, and a table of how each experiment went is written at the end
+
+import os, csv, time, traceback
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+from . import parallel
+from .cache import atomic_open
+from .instrument import RunReport
+from .pipeline import PipelineError, load_parameters, check_dependencies, run
+
+# The stages whose times are put in the status table, and the names they're recorded under in run reports
+table_stages = {
+	'fix_align': ['fix_align'],
+	'sentences': ['sideeye', 'sideeye_parse', 'sideeye_measures', 'convert_results'],
+	'questions': ['questions'],
+	'combine': ['combine'],
+}
+
+table_columns = ['parameters', 'status', 'wall_seconds'] + [stage + '_seconds' for stage in table_stages] + ['output_dir', 'report', 'error']
+
+# Get the parameters files to run from a list of files and directories
+# From a directory, every .py file in it is used, along with any parameters.py in the directories in it (one directory per experiment)
+def find_parameters_files(locs):
+	found = []
+	for loc in locs:
+		loc = Path(loc)
+		if os.path.isdir(loc):
+			found.extend(sorted(loc / f for f in os.listdir(loc) if f.endswith('.py')))
+			found.extend(sorted(loc / d / 'parameters.py' for d in os.listdir(loc) if os.path.isfile(loc / d / 'parameters.py')))
+		else:
+			found.append(loc)
+
+	# The same file could be given twice
+	unique = []
+	for loc in found:
+		if not any(os.path.abspath(loc) == os.path.abspath(other) for other in unique):
+			unique.append(loc)
+	return unique
+
+# Run one experiment whose parameters have been resolved, and return its row for the status table
+def run_one(parameters_loc, params, options):
+	record = {'parameters': str(parameters_loc), 'output_dir': str(params.output_dir) if params.output_dir is not None else str(params.fa_output_dir)}
+	run_report = RunReport(dict(options.as_dict(), parameters = str(parameters_loc)), options.profile)
+	start = time.perf_counter()
+	print("Starting " + str(parameters_loc) + "...")
+	try:
+		record['report'] = str(run(params, options, run_report))
+		record['status'] = 'completed'
+	except PipelineError as e:
+		record['status'] = 'failed'
+		record['error'] = str(e)
+	except Exception as e:
+		# One experiment going wrong shouldn't stop the others
+		record['status'] = 'failed'
+		record['error'] = type(e).__name__ + ": " + str(e)
+		traceback.print_exc()
+
+	record['wall_seconds'] = round(time.perf_counter() - start, 3)
+	for column, names in table_stages.items():
+		seconds = [stage['wall_seconds'] for stage in run_report.stages if stage['name'] in names]
+		record[column + '_seconds'] = round(sum(seconds), 3) if seconds else None
+
+	print("Finished " + str(parameters_loc) + ": " + record['status'] + ".")
+	return record
+
+# Run the experiments for a list of parameters files (or directories of them), up to experiments at once
+# Returns a row for the status table for each parameters file, in the order they were given
+def run_experiments(locs, options, experiments = 1):
+	options.batch = True
+	options.resolve()
+	if options.nothing_to_do():
+		print("Nothing to do with all of nofix, nosentences, noquestions, and nocombine set. Exiting...")
+		return []
+	check_dependencies(options)
+
+	parameters_locs = find_parameters_files(locs)
+	if not parameters_locs:
+		raise PipelineError("Error: no parameters files found in " + ", ".join(str(loc) for loc in locs) + ". Exiting...")
+
+	# Check all of the parameters before running anything, so problems with one experiment are found before the rest have run for hours
+	records = {}
+	resolved = {}
+	output_dirs = {}
+	for parameters_loc in parameters_locs:
+		# Relative locations (set in the file or defaults) are relative to the directory the parameters file is in, so experiments in their own directories don't share output
+		try:
+			experiment_dir = Path(os.path.abspath(parameters_loc)).parent
+			params = load_parameters(parameters_loc, options, experiment_dir, relative_dir = experiment_dir)
+		except PipelineError as e:
+			print(e)
+			records[parameters_loc] = {'parameters': str(parameters_loc), 'status': 'invalid', 'error': str(e)}
+			continue
+
+		# Experiments writing to the same place would overwrite each other's results
+		output_dir = os.path.abspath(params.output_dir if params.output_dir is not None else params.fa_output_dir)
+		if output_dir in output_dirs:
+			error = "Error: " + str(parameters_loc) + " has the same output directory as " + str(output_dirs[output_dir]) + " (" + output_dir + "). Not running it."
+			print(error)
+			records[parameters_loc] = {'parameters': str(parameters_loc), 'status': 'invalid', 'error': error, 'output_dir': output_dir}
+			continue
+
+		output_dirs[output_dir] = parameters_loc
+		resolved[parameters_loc] = params
+
+	print("Running " + str(len(resolved)) + " of " + str(len(parameters_locs)) + " experiments, " + str(experiments) + " at a time...")
+	with parallel.shared_pool(options.jobs):
+		with ThreadPoolExecutor(max_workers = max(1, experiments)) as executor:
+			futures = {parameters_loc: executor.submit(run_one, parameters_loc, params, options) for parameters_loc, params in resolved.items()}
+			for parameters_loc, future in futures.items():
+				records[parameters_loc] = future.result()
+
+	return [records[parameters_loc] for parameters_loc in parameters_locs]
+
+# Write out the status table as a csv, and return its location
+def write_status_table(records, loc):
+	with atomic_open(loc, 'w') as file:
+		writer = csv.DictWriter(file, fieldnames = table_columns, restval = 'NA', lineterminator = '\n')
+		writer.writeheader()
+		for record in records:
+			writer.writerow({column: 'NA' if record.get(column) is None else record[column] for column in table_columns})
+	return loc
+
+# Print out the status table, with the parameters files shown by their directory and name, since many are called parameters.py
+def print_status_table(records):
+	print("%-40s %-10s %10s %10s %10s %10s %10s" % ('parameters', 'status', 'total (s)', 'fix_align', 'sentences', 'questions', 'combine'))
+	for record in records:
+		loc = Path(os.path.abspath(record['parameters']))
+		times = [record.get(column) for column in ['wall_seconds'] + [stage + '_seconds' for stage in table_stages]]
+		print("%-40s %-10s %s" % (loc.parent.name + os.sep + loc.name, record['status'], " ".join("%10s" % ('-' if t is None else '%.2f' % t) for t in times)))
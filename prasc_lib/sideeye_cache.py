@@ -0,0 +1,255 @@
+##############################################################################################
+########################## On-disk cache of ASCs parsed by SideEye ###########################
+##############################################################################################
+
+import os, json, time, pickle, shutil, hashlib, tempfile
+from collections import defaultdict
+from functools import lru_cache
+from datetime import datetime
+from pathlib import Path
+
+from .cache import file_hash, file_fingerprint, load_manifest, save_manifest, atomic_open
+from .parallel import ordered_map, make_shards
+from .compressed import compression, is_asc, uncompressed_name, open_asc
+from .instrument import RssSampler
+
+# Records the hashes of the ASCs, so files that haven't been touched don't need to be reread to look them up
+hashes_name = 'hashes.json'
+# Records which results file in the results cache belongs to each ASC
+results_name = 'results.json'
+
+def sideeye_version():
+	try:
+		from importlib.metadata import version
+		return version('sideeye')
+	except Exception:
+		return 'unknown'
+
+# The parsed experiment for an ASC depends on the ASC, the regions in sentences.txt, and the asc_parsing settings in config.json
+# (and the version of SideEye, since the cached objects are SideEye's own classes)
+def cache_key(asc_hash, sentences_hash, asc_parsing):
+	key = json.dumps([asc_hash, sentences_hash, asc_parsing, sideeye_version()], sort_keys = True)
+	return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+# SideEye trials keep their measures in defaultdicts made with a lambda, which can't be pickled
+# They're always empty when an experiment is cached, so leave them out and make new ones when loading
+def restore_trial(cls, state):
+	trial = cls.__new__(cls)
+	trial.__dict__.update(state)
+	trial.trial_measures = defaultdict(dict)
+	trial.region_measures = defaultdict(lambda: defaultdict(dict))
+	return trial
+
+class ExperimentPickler(pickle.Pickler):
+	def reducer_override(self, obj):
+		if hasattr(obj, 'region_measures') and hasattr(obj, 'trial_measures'):
+			state = {key: value for key, value in obj.__dict__.items() if not key in ('trial_measures', 'region_measures')}
+			return restore_trial, (type(obj), state)
+		return NotImplemented
+
+def load_experiment(loc):
+	try:
+		with open(loc, 'rb') as file:
+			return pickle.load(file)
+	except Exception:
+		return None
+
+def save_experiment(experiment, loc):
+	try:
+		with atomic_open(loc, 'wb') as file:
+			ExperimentPickler(file, protocol = pickle.HIGHEST_PROTOCOL).dump(experiment)
+	except Exception as e:
+		print("Warning: unable to cache parsed ASC file (" + str(e) + "). Continuing...")
+
+# SideEye configurations can't be pickled, so worker processes load their own (once each)
+# They're kept by modification time as well, since workers can outlive a run (in watch mode) and config.json could be edited in between
+# Results are always calculated in long format, whatever wide_format is set to, since prASC pivots them to wide itself (see combine.WidePivot)
+def load_config(config_json_loc):
+	return load_config_version(str(config_json_loc), os.path.getmtime(config_json_loc))
+
+@lru_cache(maxsize = None)
+def load_config_version(config_json_loc, mtime):
+	import sideeye
+	config = sideeye.config.Configuration(config_json_loc)
+	config.wide_format = False
+	return config
+
+# The name SideEye gives the experiment for an ASC: its file name without any extensions
+def experiment_name(experiment_file):
+	return "".join(uncompressed_name(os.path.split(experiment_file)[1]).split(".")[:-1])
+
+# Parse an ASC with SideEye. Compressed ASCs are decompressed in memory and given to SideEye's parser as text, as it would read them
+def parse_asc(experiment_file, items, asc_parsing):
+	import sideeye
+
+	if compression(experiment_file) is None:
+		return sideeye.parser.asc.parse(experiment_file, items, asc_parsing)
+
+	with open_asc(experiment_file) as file:
+		trials = sideeye.parser.asc.get_trials(file.read(), items, asc_parsing)
+	return sideeye.data.Experiment(experiment_name(experiment_file), trials, experiment_file, datetime.fromtimestamp(os.path.getmtime(experiment_file)))
+
+# sideeye.parser.experiment.parse_files for ASCs and sentences.txt, which also reads compressed ASCs
+def parse_files(file_list, sentences_txt_loc, sideEyeConfig):
+	import sideeye
+
+	items = sideeye.parser.region.textfile(str(sentences_txt_loc), verbose = sideEyeConfig.terminal_output)
+	experiments = []
+	for experiment_file in file_list:
+		if is_asc(experiment_file):
+			experiments.append(parse_asc(experiment_file, items, sideEyeConfig.asc_parsing))
+		else:
+			print("Skipping %s: not a DA1 or ASC file." % experiment_file)
+	return experiments
+
+# A drop-in replacement for sideeye.parser.experiment.parse_files that only parses ASCs that aren't in cache_dir
+# Experiments are cached before any measures are calculated, so changing region_measures in config.json doesn't invalidate them
+# hashes can be passed in if the hashes of the files are already known, so worker processes don't all update the hashes manifest
+def parse_files_cached(file_list, sentences_txt_loc, config_json_loc, sideEyeConfig, cache_dir, hashes = None):
+	import sideeye
+
+	cache_dir = Path(cache_dir)
+	if not os.path.exists(cache_dir):
+		os.makedirs(cache_dir)
+
+	with open(config_json_loc, 'r') as file:
+		asc_parsing = json.load(file).get('asc_parsing', {})
+
+	sentences_hash = file_hash(sentences_txt_loc)
+	if hashes is None:
+		hashes = asc_hashes(file_list, cache_dir)
+
+	items = None
+	experiments = []
+	for experiment_file in file_list:
+		if not is_asc(experiment_file):
+			print("Skipping %s: not a DA1 or ASC file." % experiment_file)
+			continue
+
+		experiment_loc = cache_dir / (cache_key(hashes[experiment_file], sentences_hash, asc_parsing) + '.pickle')
+
+		experiment = load_experiment(experiment_loc)
+		if experiment is None:
+			# Only parse sentences.txt if there's at least one ASC that isn't cached
+			if items is None:
+				items = sideeye.parser.region.textfile(str(sentences_txt_loc), verbose = sideEyeConfig.terminal_output)
+			experiment = parse_asc(experiment_file, items, sideEyeConfig.asc_parsing)
+			save_experiment(experiment, experiment_loc)
+		else:
+			# The cache is keyed on contents, so the same experiment could have come from a file with a different name or date
+			experiment.name = experiment_name(experiment_file)
+			experiment.filename = experiment_file
+			experiment.date = datetime.fromtimestamp(os.path.getmtime(experiment_file))
+
+		experiments.append(experiment)
+
+	return experiments
+
+# Get the content hash of each ASC, using the hashes manifest in cache_dir to avoid rereading files that haven't been touched
+def asc_hashes(file_list, cache_dir):
+	hashes = load_manifest(Path(cache_dir) / hashes_name)
+	file_hashes = {}
+	for file in file_list:
+		hash_key = os.path.abspath(file)
+		hashes[hash_key] = file_fingerprint(file, hashes.get(hash_key))
+		file_hashes[file] = hashes[hash_key]['hash']
+	save_manifest(hashes, Path(cache_dir) / hashes_name)
+	return file_hashes
+
+# The results for an ASC depend on the ASC, sentences.txt, and all of config.json
+# The path and modification time of the ASC are also included, since they are written out as the filename and date
+# 'long' marks results that are in long format whatever config.json says, unlike those kept before prASC did its own pivoting
+def results_key(file, asc_hash, sentences_hash, config_hash):
+	key = json.dumps([os.path.abspath(file), os.path.getmtime(file), asc_hash, sentences_hash, config_hash, sideeye_version(), 'long'])
+	return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+# Parse a chunk of ASCs and calculate their measures (possibly in a worker process), writing the results to results_loc
+# If cache_dir is set, parsed ASCs are taken from and added to the cache
+# Returns how long parsing and calculating measures took, and the peak memory of the process that did it while it did
+def measure_chunk(task, sentences_txt_loc, config_json_loc, cache_dir = None):
+	import sideeye
+
+	files, hashes, results_loc = task
+	sideEyeConfig = load_config(config_json_loc)
+	sampler = RssSampler().start()
+	start = time.perf_counter()
+	if cache_dir is None:
+		experiments = parse_files(files, sentences_txt_loc, sideEyeConfig)
+	else:
+		experiments = parse_files_cached(files, sentences_txt_loc, config_json_loc, sideEyeConfig, cache_dir, hashes)
+
+	parsed = time.perf_counter()
+	results = sideeye.calculate_all_measures(experiments, None, sideEyeConfig)
+	with atomic_open(results_loc) as file:
+		file.write(results)
+
+	return {'parse_seconds': round(parsed - start, 4), 'measures_seconds': round(time.perf_counter() - parsed, 4), 'peak_rss_mb': sampler.stop()}
+
+# Split file_list into jobs chunks, and parse and calculate measures for them in a pool of worker processes
+# Each worker writes its results to a partial file, and the parts are merged into csv_loc in order, so the output is the same as for a single process
+# Returns the files in each chunk, with how long parsing and calculating measures for them took
+def calculate_all_measures_parallel(file_list, sentences_txt_loc, config_json_loc, sideEyeConfig, csv_loc, jobs = 1):
+	import sideeye
+
+	with tempfile.TemporaryDirectory(prefix = 'prASC_parts_', dir = os.path.dirname(os.path.abspath(csv_loc))) as temp_dir:
+		parts = [(chunk, None, Path(temp_dir) / ('part_' + str(i) + '.csv')) for i, chunk in enumerate(make_shards(file_list, jobs))]
+		timings = [dict(timing, files = part[0]) for part, timing in zip(parts, ordered_map(measure_chunk, parts, (sentences_txt_loc, config_json_loc), jobs))]
+
+		merge_results(sideeye.calculate_all_measures([], None, sideEyeConfig), [part[2] for part in parts], csv_loc)
+
+	return timings
+
+# A replacement for parsing file_list and running sideeye.calculate_all_measures on it that keeps a results file for each ASC in cache_dir
+# Only ASCs that are new, or whose results are out of date, are processed (using up to jobs worker processes)
+# measured has the ASCs whose results were just calculated into cache_dir some other way (see streaming.py), with how long that took
+# csv_loc is then rebuilt from the results for each ASC
+# Returns how long parsing and calculating measures took for each ASC that was processed
+def calculate_all_measures_cached(file_list, sentences_txt_loc, config_json_loc, sideEyeConfig, cache_dir, csv_loc, jobs = 1, measured = {}):
+	import sideeye
+
+	results_dir = Path(cache_dir) / 'results'
+	if not os.path.exists(results_dir):
+		os.makedirs(results_dir)
+
+	file_list = [file for file in file_list if is_asc(file)]
+	hashes = asc_hashes(file_list, cache_dir)
+	sentences_hash = file_hash(sentences_txt_loc)
+	config_hash = file_hash(config_json_loc)
+
+	results = load_manifest(Path(cache_dir) / results_name)
+	keys = {file: results_key(file, hashes[file], sentences_hash, config_hash) for file in file_list}
+	measured = {file: timing for file, timing in measured.items() if file in keys and os.path.isfile(results_dir / (keys[file] + '.csv'))}
+	stale = [file for file in file_list if file in measured or not os.path.isfile(results_dir / (keys[file] + '.csv'))]
+	to_measure = [file for file in stale if not file in measured]
+
+	if to_measure:
+		print("Calculating measures for " + str(len(to_measure)) + " of " + str(len(file_list)) + " ASC files (the rest are up to date)...")
+
+	tasks = [([file], {file: hashes[file]}, results_dir / (keys[file] + '.csv')) for file in to_measure]
+	timings = {file: measured[file] for file in stale if file in measured}
+	for file, timing in zip(to_measure, ordered_map(measure_chunk, tasks, (sentences_txt_loc, config_json_loc, cache_dir), jobs)):
+		timings[file] = timing
+
+	for file in stale:
+		# Get rid of the old results for this file
+		old_key = results.get(os.path.abspath(file))
+		if old_key and old_key != keys[file] and os.path.isfile(results_dir / (old_key + '.csv')):
+			os.remove(results_dir / (old_key + '.csv'))
+		results[os.path.abspath(file)] = keys[file]
+
+	save_manifest(results, Path(cache_dir) / results_name)
+
+	# With no experiments, SideEye just gives the header
+	header = sideeye.calculate_all_measures([], None, sideEyeConfig)
+	merge_results(header, [results_dir / (keys[file] + '.csv') for file in file_list], csv_loc)
+
+	return timings
+
+# Write out the header, followed by the results for each file without their headers
+def merge_results(header, result_files, csv_loc):
+	with open(csv_loc, 'w') as output:
+		output.write(header)
+		for loc in result_files:
+			with open(loc, 'r') as results:
+				results.readline()
+				shutil.copyfileobj(results, output)
@@ -0,0 +1,210 @@
+##############################################################################################
+####### Streaming each ASC through fix_align, question scoring, and SideEye on its own #######
+##############################################################################################
+
+# Normally each stage runs on every ASC before the next stage starts, so every file waits for the slowest file in the stage before
+# With --stream, each ASC goes on to question scoring as soon as it's fix aligned, and on to SideEye as soon as it's scored
+# Each stage is a few threads reading from a bounded queue (so a quick stage can only get so far ahead of a slow one), which hand
+# the work for each file to the shared pool of worker processes (see parallel.shared_pool), or run it themselves with one job
+# Only combining waits for every file. The question files and results.csv are then written out in the same order, and are the same,
+# as running the stages one after another: the usual stages are run on the streamed files, and just pick up what was done for each one
+
+import os, queue, tempfile, threading
+from contextlib import nullcontext
+from pathlib import Path
+
+from . import parallel
+from .cache import file_hash, file_fingerprint, load_manifest, save_manifest
+from .compressed import is_asc, uncompressed_name
+from .fix_align import fa_name, strip_quotes
+from .instrument import timed_call
+from .pipeline import prepare_fix_align, finish_fix_align, fa_files, sentences_stage, questions_stage
+
+# How many files can be waiting for each thread of a stage
+queue_per_thread = 2
+
+# Put on a stage's queue after the last file, so its threads know to stop
+done = object()
+
+# A stage of the stream: threads threads that each take a file from inbox, run step on it, and put what step returns on outbox
+# (unless it's None, e.g. for a file fix_align failed for). Once the last thread has stopped, done is put on outbox for the next stage
+# If step raises an exception, it's kept in errors, and the rest of the files are passed over (so no stage is left waiting on a full queue)
+class Stage:
+	def __init__(self, step, threads, outbox, errors):
+		self.step = step
+		self.inbox = queue.Queue(maxsize = queue_per_thread * threads)
+		self.outbox = outbox
+		self.errors = errors
+		self.running = threads
+		self.lock = threading.Lock()
+		self.threads = [threading.Thread(target = self.run, daemon = True) for _ in range(threads)]
+
+	def start(self):
+		for thread in self.threads:
+			thread.start()
+
+	def join(self):
+		for thread in self.threads:
+			thread.join()
+
+	def run(self):
+		while True:
+			file = self.inbox.get()
+			if file is done:
+				# Leave it for the other threads
+				self.inbox.put(done)
+				break
+
+			result = None
+			if not self.errors:
+				try:
+					result = self.step(file)
+				except BaseException as e:
+					self.errors.append(e)
+			if result is not None and self.outbox is not None:
+				self.outbox.put(result)
+
+		with self.lock:
+			self.running = self.running - 1
+			last = self.running == 0
+		if last and self.outbox is not None:
+			self.outbox.put(done)
+
+# Fix align an ASC with fix_align, in an R worker if there are any, or its own Rscript process, and return where the aligned file went
+# Returns None if it failed. What each file gave is kept in results, to report and merge the summaries once they're all done
+def align_r(file, fix_align, fa_params, params, workers, results):
+	from .fix_align import run_shard
+
+	results[file] = parallel.in_slot(run_shard, [file], fix_align, fa_params, params.fa_output_dir, 'Rscript', workers, params.fa_compression)
+	return None if results[file][1] else str(Path(params.fa_output_dir) / fa_name(file, params.fa_compression))
+
+# Run fix_align, question scoring, and SideEye (whichever of them options has) on each ASC as soon as it's ready for them, then
+# write out the results and question files for all of them. Returns the ASC files to analyze, like fix_align_stage
+def stream_stages(params, options, columns, run_report):
+	# The worker processes have to be started before any of the stages' threads (see parallel.shared_pool)
+	with parallel.shared_pool(options.jobs) if parallel.shared_executor is None else nullcontext():
+		return run_stream(params, options, columns, run_report)
+
+def run_stream(params, options, columns, run_report):
+	print("Streaming ASC files through " + ", ".join(name for name, skipped in [('fix_align', options.nofix), ('question scoring', options.noquestions), ('SideEye', options.nosentences)] if not skipped) + "...")
+	errors = []
+	stages = []
+	outbox = None
+	temp_dir = None
+
+	try:
+		# The stages are made from the last one back, since each one needs the queue of the next
+		if not options.nosentences:
+			from .sideeye_cache import measure_chunk, results_key, hashes_name
+
+			cache_dir = params.cache_dir
+			if options.nocache or cache_dir is None:
+				# The results for each file still have to go somewhere to be put together in order, but nothing from earlier runs is used
+				temp_dir = tempfile.TemporaryDirectory(prefix = 'prASC_stream_', dir = params.output_dir)
+				cache_dir = temp_dir.name
+			results_dir = Path(cache_dir) / 'results'
+			os.makedirs(results_dir, exist_ok = True)
+
+			hashes = load_manifest(Path(cache_dir) / hashes_name)
+			sentences_hash = file_hash(params.sentences_txt_loc)
+			config_hash = file_hash(params.config_json_loc)
+			measured = {}
+
+			# Calculate the measures for an ASC into the results cache, unless they're already there
+			# Parsed ASCs are cached along with them, unless nothing is being cached
+			def measure(file):
+				if is_asc(file):
+					hash_key = os.path.abspath(file)
+					hashes[hash_key] = file_fingerprint(file, hashes.get(hash_key))
+					asc_hash = hashes[hash_key]['hash']
+					loc = results_dir / (results_key(file, asc_hash, sentences_hash, config_hash) + '.csv')
+					if not os.path.isfile(loc):
+						measured[file] = parallel.submit(measure_chunk, ([file], {file: asc_hash}, loc), params.sentences_txt_loc, params.config_json_loc, None if temp_dir else cache_dir).result()
+				return file
+
+			stages.insert(0, Stage(measure, options.jobs, outbox, errors))
+			outbox = stages[0].inbox
+
+		if not options.noquestions:
+			from .questions import score_questions, score_questions_indexed, cached_scores, load_question_cache
+
+			start_flag = strip_quotes(params.fa_settings['start_flag'])
+			use_cache = not options.nocache and params.cache_dir is not None
+			question_cache = load_question_cache(params.cache_dir) if use_cache else {}
+			scorer = score_questions if options.nocache else score_questions_indexed
+			scored = {}
+
+			# Score an ASC's questions, unless its scores are already cached
+			def score(file):
+				if not use_cache or cached_scores(question_cache, file, start_flag) is None:
+					scored[file] = parallel.submit(timed_call, file, scorer, start_flag).result()
+				return file
+
+			stages.insert(0, Stage(score, options.jobs, outbox, errors))
+			outbox = stages[0].inbox
+
+		# Fix aligned files that are up to date go straight on to the next stage, and the rest follow as they're aligned
+		fa_stage = None
+		if options.nofix:
+			files = [str(Path(params.fa_output_dir) / f) for f in os.listdir(params.fa_output_dir) if '.asc' in f]
+		else:
+			to_align_list, fa_entries, fa_params = prepare_fix_align(params, options)
+			to_align = set(to_align_list)
+			realigned = set(uncompressed_name(fa_name(file)) for file in to_align_list)
+			files = [file for file in fa_files(params.fa_output_dir) if not uncompressed_name(os.path.basename(file)) in realigned] + to_align_list
+
+			aligned = {}
+			from .fix_align import load_fix_align, get_worker_pool
+			fix_align = load_fix_align(params.fix_align_loc) if to_align_list else None
+			workers = get_worker_pool(fix_align) if options.rworker and to_align_list else None
+
+			def align(file):
+				if not file in to_align:
+					return file
+				return align_r(file, fix_align, fa_params, params, workers, aligned)
+
+			stages.insert(0, Stage(align, options.jobs, outbox, errors))
+			# The stages overlap, so fix_align's time is the time for the whole stream. It's only a stage if there's anything to align
+			if to_align_list:
+				fa_stage = run_report.start('fix_align', to_align_list)
+
+		stream = run_report.start('stream', files)
+		for stage in stages:
+			stage.start()
+		if stages:
+			for file in files:
+				stages[0].inbox.put(file)
+			stages[0].inbox.put(done)
+		for stage in stages:
+			stage.join()
+		run_report.finish(stream)
+
+		if errors:
+			# Every stage that was started is finished, so it stops measuring memory
+			if fa_stage is not None:
+				run_report.finish(fa_stage, failed = len(to_align_list))
+			raise errors[0]
+
+		if not options.nofix:
+			from .fix_align import merge_summaries
+			merge_summaries([summary for file in to_align_list for summary in aligned[file][0]], params.fa_output_dir)
+			fa_failures = {failed: error for file in to_align_list for failed, error in aligned[file][1].items()}
+
+			if fa_stage is not None:
+				finish_fix_align(params, run_report, fa_stage, to_align_list, fa_entries, fa_failures)
+			else:
+				print("All ASC files have up to date fix aligned versions. Skipping fix_align. Use '--refix' ('-r') to re-fix align ASCs.")
+			files = fa_files(params.fa_output_dir)
+
+		# The usual stages put everything together in order, and handle any files that weren't streamed
+		if not options.nosentences:
+			save_manifest(hashes, Path(cache_dir) / hashes_name)
+			sentences_stage(params, options, files, run_report, (cache_dir, measured))
+
+		if not options.noquestions:
+			questions_stage(params, options, columns, files, run_report, scored)
+	finally:
+		if temp_dir is not None:
+			temp_dir.cleanup()
+
+	return files
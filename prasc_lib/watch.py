@@ -0,0 +1,109 @@
+##############################################################################################
+############ Watching the ASC directory, and processing new ASCs as they're added ############
+##############################################################################################
+
+# The directory is polled, so this works the same everywhere (including network drives, where change notifications often don't)
+# A round of processing only starts once no ASC has changed for settle seconds, so files that are still being copied aren't read
+# Each round runs the usual stages, which skip ASCs they've already handled: fix_align has its manifest, and SideEye results
+# and question scores are cached for each ASC. So only new and changed files are fix aligned, parsed, and scored, and the
+# combined results are rebuilt from the cached results for every file. Worker processes (and R workers with --rworker) are kept between rounds
+
+import os, time
+from pathlib import Path
+
+from . import parallel
+from .pipeline import PipelineError, default_dir, check_dependencies, load_parameters, run
+
+# Keeps track of the ASCs in a directory, and when they last changed
+class AscWatcher:
+	def __init__(self, directory, settle = 5):
+		self.directory = directory
+		self.settle = settle
+		self.seen = {}
+		self.changed_at = None
+		# The ASCs as they were the last time they were processed
+		self.processed = None
+
+	# Get the size and modification time of each ASC. Hidden files are left out, since copying tools use them for partial files
+	def snapshot(self):
+		files = {}
+		for f in os.listdir(self.directory):
+			if '.asc' in f and not f.startswith('.'):
+				try:
+					stat = os.stat(Path(self.directory) / f)
+				except OSError:
+					# It was removed while we were looking
+					continue
+				files[f] = (stat.st_size, stat.st_mtime_ns)
+		return files
+
+	# Check the directory. Returns the ASCs if they've changed since they were processed and have settled, or None if there's nothing to do yet
+	def poll(self, now = None):
+		now = time.monotonic() if now is None else now
+		current = self.snapshot()
+		if current != self.seen:
+			self.seen = current
+			self.changed_at = now
+			return None
+
+		# Nothing to process until the first ASC arrives (an empty directory is how data collection starts)
+		if not current or self.changed_at is None:
+			return None
+
+		if current == self.processed or now - self.changed_at < self.settle:
+			return None
+
+		return current
+
+	# Get the names of the ASCs in snapshot that are new or have changed since they were processed
+	def changed(self, snapshot):
+		previous = self.processed or {}
+		return sorted(f for f, stat in snapshot.items() if previous.get(f) != stat)
+
+	def mark_processed(self, snapshot):
+		self.processed = snapshot
+
+# Watch the ASC directory for an experiment, and process its ASCs whenever they change, until interrupted (or for rounds rounds)
+# ASCs that are already there are processed in the first round. Errors in a round are printed, and the next change starts another
+# options.batch, overwrite, and keepall are always set, since nobody is there to answer questions, and each round replaces the last one's output
+# asc_files_dir can start out empty (options.watch lets the parameters through without any ASCs), and the first round waits for an ASC to arrive
+# Returns the number of rounds that were run
+def watch(parameters_loc, options, base_dir = default_dir, interval = 2, settle = 5, rounds = None):
+	options.batch = True
+	options.watch = True
+	options.overwrite = True
+	options.keepall = True
+	options.resolve()
+	if options.nothing_to_do():
+		print("Nothing to do with all of nofix, nosentences, noquestions, and nocombine set. Exiting...")
+		return 0
+
+	check_dependencies(options)
+	params = load_parameters(parameters_loc, options, base_dir)
+	watcher = AscWatcher(params.asc_files_dir, settle)
+
+	print("Watching " + str(params.asc_files_dir) + " for new ASC files (checking every " + str(interval) + "s). Press Ctrl+C to stop.")
+	ran = 0
+	with parallel.shared_pool(options.jobs):
+		try:
+			while rounds is None or ran < rounds:
+				snapshot = watcher.poll()
+				if snapshot is None:
+					time.sleep(interval)
+					continue
+
+				changed = watcher.changed(snapshot)
+				print(time.strftime('%Y-%m-%d %H:%M:%S') + ": " + str(len(changed)) + " new or changed ASC file(s): " + ", ".join(changed))
+				try:
+					run(params, options)
+					print("Results updated in " + str(params.output_dir if params.output_dir is not None else params.fa_output_dir) + ".")
+				except PipelineError as e:
+					print(e)
+					print("Waiting for ASC files to change before trying again...")
+
+				watcher.mark_processed(snapshot)
+				ran = ran + 1
+		except KeyboardInterrupt:
+			print("Stopped watching " + str(params.asc_files_dir) + ".")
+
+	return ran